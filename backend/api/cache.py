@@ -0,0 +1,259 @@
+import hashlib
+import re
+import secrets
+import threading
+from collections import Counter, OrderedDict
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import urlencode
+
+SLUG = re.compile(r'^[-a-zA-Z0-9_]+$')
+
+
+class ShoppingListPdfCache:
+    """
+    LRU-кэш отрендеренных списков покупок, ограниченный суммарным размером.
+
+    Ключом служит хэш агрегированного списка ингредиентов, поэтому
+    одинаковые корзины разных пользователей используют один PDF-файл.
+    Для каждого пользователя запоминается ключ его последнего списка:
+    при изменении корзины файл удаляется, если больше никому не нужен.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._user_keys = {}
+        self._references = Counter()
+
+    def get(self, key: str, user_id: int | None = None) -> bytes | None:
+        with self._lock:
+            if user_id is not None:
+                self._bind(user_id, key)
+
+            pdf_file = self._entries.get(key)
+            if pdf_file is not None:
+                self._entries.move_to_end(key)
+
+            return pdf_file
+
+    def set(self, key: str, pdf_file: bytes):
+        with self._lock:
+            self._store(key, pdf_file)
+
+    def get_or_create(self,
+                      key: str,
+                      user_id: int,
+                      render: Callable[[], bytes]) -> bytes:
+        pdf_file = self.get(key, user_id)
+        if pdf_file is not None:
+            return pdf_file
+
+        pdf_file = render()
+        self.set(key, pdf_file)
+
+        return pdf_file
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            key = self._user_keys.pop(user_id, None)
+            if key is None:
+                return
+
+            self._references[key] -= 1
+            if self._references[key] <= 0:
+                del self._references[key]
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._user_keys.clear()
+            self._references.clear()
+
+    def _bind(self, user_id: int, key: str):
+        previous = self._user_keys.get(user_id)
+        if previous == key:
+            return
+
+        if previous is not None:
+            self._references[previous] -= 1
+            if self._references[previous] <= 0:
+                del self._references[previous]
+        self._user_keys[user_id] = key
+        self._references[key] += 1
+
+    def _store(self, key: str, pdf_file: bytes):
+        if key in self._entries or len(pdf_file) > self.max_size:
+            return
+
+        self._entries[key] = pdf_file
+        self._size += len(pdf_file)
+
+        while self._size > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _discard(self, key: str):
+        pdf_file = self._entries.pop(key, None)
+        if pdf_file is not None:
+            self._size -= len(pdf_file)
+
+
+class ResponseCache:
+    """
+    Кэш данных ответов, не зависящих от пользователя.
+
+    Каждая запись помнит версии пространств имен, от которых зависит:
+    рецепта ('recipe:<id>'), автора ('author:<id>'), тега ('tag:<slug>')
+    и общих ('recipes', 'tags', 'ingredients'). Изменение данных
+    заменяет версию пространства, и зависящие от него записи перестают
+    считаться актуальными, не затрагивая остальные.
+
+    Версии пространств фильтра читаются до формирования ответа, а
+    версии показанных рецептов и авторов — после, поэтому изменение,
+    зафиксированное в этот промежуток, может остаться незамеченным
+    до истечения времени жизни записи.
+    """
+
+    def __init__(self, alias: str, timeout: int, prefix: str = 'response'):
+        self.alias = alias
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self) -> bool:
+        return self.timeout > 0
+
+    def get_key(self, request) -> str:
+        """Ключ запроса с нормализованной строкой параметров."""
+        query = urlencode(
+            sorted(
+                (name, sorted(values))
+                for name, values in request.query_params.lists()
+            ),
+            doseq=True
+        )
+        url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+
+        return f'{self.prefix}:{hashlib.sha256(url.encode()).hexdigest()}'
+
+    def get(self, key: str):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+
+        versions = entry['versions']
+        current = self.cache.get_many(
+            self._version_key(namespace) for namespace in versions
+        )
+        for namespace, version in versions.items():
+            if current.get(self._version_key(namespace)) != version:
+                return None
+
+        return entry['data']
+
+    def set(self, key: str, data, versions: dict):
+        self.cache.set(
+            key,
+            {'versions': versions, 'data': data},
+            self.timeout
+        )
+
+    def get_versions(self, namespaces) -> dict:
+        """Текущие версии пространств, недостающие создаются."""
+        keys = {
+            self._version_key(namespace): namespace
+            for namespace in namespaces
+        }
+        versions = self.cache.get_many(keys)
+
+        missing = {
+            key: self._new_version() for key in keys if key not in versions
+        }
+        if missing:
+            self.cache.set_many(missing, timeout=None)
+            versions.update(missing)
+
+        return {keys[key]: version for key, version in versions.items()}
+
+    def invalidate(self, namespaces):
+        if not self.enabled:
+            return
+
+        self.cache.set_many(
+            {
+                self._version_key(namespace): self._new_version()
+                for namespace in set(namespaces)
+            },
+            timeout=None
+        )
+
+    def _version_key(self, namespace: str) -> str:
+        return f'{self.prefix}:version:{namespace}'
+
+    @staticmethod
+    def _new_version() -> str:
+        return secrets.token_hex(8)
+
+
+def get_recipe_list_namespaces(query_params) -> list | None:
+    """
+    Пространства, от которых зависит состав списка рецептов.
+
+    Возвращает None, если параметры фильтра некорректны: такой
+    ответ не кэшируется.
+    """
+    namespaces = ['tags', 'ingredients']
+    tags = query_params.getlist('tags')
+    author = query_params.get('author')
+
+    if not all(SLUG.match(slug) for slug in tags):
+        return None
+    if author is not None and not author.isdigit():
+        return None
+
+    # Результат поиска зависит от текста любого рецепта.
+    if 'search' in query_params or not (tags or author):
+        namespaces.append('recipes')
+    namespaces.extend(f'tag:{slug}' for slug in tags)
+    if author is not None:
+        namespaces.append(f'author:{author}')
+
+    return namespaces
+
+
+def get_recipe_data_namespaces(data) -> list:
+    """Пространства рецептов и авторов, попавших в ответ."""
+    if isinstance(data, dict):
+        recipes = data['results'] if 'results' in data else [data]
+    else:
+        recipes = data
+
+    namespaces = []
+    for recipe in recipes:
+        namespaces.append(f'recipe:{recipe["id"]}')
+        if recipe['author'] is not None:
+            namespaces.append(f'author:{recipe["author"]["id"]}')
+
+    return namespaces
+
+
+shopping_list_pdf_cache = ShoppingListPdfCache(
+    settings.SHOPPING_LIST_PDF_CACHE_SIZE
+)
+
+recipe_response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_ALIAS,
+    settings.RESPONSE_CACHE_TIMEOUT,
+    prefix='recipes'
+)
@@ -1,5 +1,8 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.counters import has_any_tag
+from recipes.fulltext import search
+from recipes.models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
 
 
 class IngredientFilter(filters.FilterSet):
@@ -24,12 +27,17 @@ class RecipeFilter(filters.FilterSet):
         queryset=Tag.objects.all(),
         field_name='tags__slug',
         to_field_name='slug',
+        method='get_tags',
         )
 
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
         label='shopping_cart',
     )
+    search = filters.CharFilter(
+        method='get_search',
+        label='search',
+    )
 
     class Meta:
         model = Recipe
@@ -38,18 +46,37 @@ class RecipeFilter(filters.FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
         )
 
+    def get_tags(self, queryset, name, tags):
+        if not tags:
+            return queryset
+
+        condition = has_any_tag(tag.pk for tag in tags)
+        if condition is None:
+            return queryset.filter(tags__in=tags).distinct()
+
+        return queryset.filter(condition)
+
     def get_favorite(self, queryset, name, value):
-        if value:
-            return queryset.filter(in_favorite__user=self.request.user)
-        return queryset.exclude(
-            in_favorite__user=self.request.user
-        )
+        return self._filter_by_user_relation(queryset, Favourite, value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return Recipe.objects.filter(
-                shopping_recipe__user=self.request.user
-            )
-        return None
+        return self._filter_by_user_relation(queryset, ShoppingCart, value)
+
+    def _filter_by_user_relation(self, queryset, model, value):
+        user = self.request.user
+
+        # У анонимного пользователя нет ни избранного, ни списка покупок.
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+
+        exists = Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        )
+
+        return queryset.filter(exists if value else ~exists)
+
+    def get_search(self, queryset, name, value):
+        return search(queryset, value)
@@ -0,0 +1,147 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.conf import settings
+
+from .cache import shopping_list_pdf_cache
+from .pdf import write_pdf
+
+
+class ShoppingListRenderer:
+    """
+    Фоновый рендеринг списков покупок в пуле процессов.
+
+    Идентификатором задачи служит хэш списка ингредиентов: одинаковые
+    списки рендерятся один раз, а готовый файл попадает в кэш PDF.
+    Число одновременно ожидающих задач ограничено max_pending.
+
+    Итог завершенной задачи хранится result_ttl секунд, но не больше
+    чем для max_pending задач: ошибка отдается клиенту при опросе,
+    а файл, не попавший в кэш PDF, — при скачивании.
+    """
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    EXPIRED = 'expired'
+
+    def __init__(self, max_workers: int, max_pending: int,
+                 result_ttl: int = 300):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = {}
+        self._results = OrderedDict()
+
+    def submit(self, key: str, html: str) -> bool:
+        """
+        Ставит задачу в очередь.
+
+        Возвращает False, если очередь заполнена.
+        """
+        with self._lock:
+            if key in self._jobs:
+                return True
+
+            result = self._get_result(key)
+            if result is not None and result[1] is not None:
+                return True
+
+            if len(self._jobs) >= self.max_pending:
+                return False
+
+            try:
+                future = self._get_executor().submit(write_pdf, html)
+            except BrokenProcessPool:
+                self._executor = None
+                future = self._get_executor().submit(write_pdf, html)
+            self._jobs[key] = future
+            self._results.pop(key, None)
+
+        future.add_done_callback(partial(self._finish, key))
+
+        return True
+
+    def status(self, key: str) -> str | None:
+        if shopping_list_pdf_cache.get(key) is not None:
+            return self.DONE
+
+        with self._lock:
+            if key in self._jobs:
+                return self.PENDING
+
+            result = self._get_result(key)
+
+        if result is None:
+            return None
+
+        state, pdf_file = result
+        if state == self.DONE and pdf_file is None:
+            return self.EXPIRED
+
+        return state
+
+    def get_pdf(self, key: str) -> bytes | None:
+        """Готовый файл задачи из кэша PDF или из итогов задач."""
+        pdf_file = shopping_list_pdf_cache.get(key)
+        if pdf_file is not None:
+            return pdf_file
+
+        with self._lock:
+            result = self._get_result(key)
+
+        return None if result is None else result[1]
+
+    def _finish(self, key: str, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            state, pdf_file = self.FAILED, None
+        else:
+            state, pdf_file = self.DONE, future.result()
+            shopping_list_pdf_cache.set(key, pdf_file)
+            if shopping_list_pdf_cache.get(key) is not None:
+                # Файл хранится в кэше PDF; если его вытеснят,
+                # задача будет считаться устаревшей.
+                pdf_file = None
+
+        with self._lock:
+            self._jobs.pop(key, None)
+            self._results.pop(key, None)
+            self._results[key] = (
+                state, pdf_file, time.monotonic() + self.result_ttl
+            )
+            while len(self._results) > self.max_pending:
+                self._results.popitem(last=False)
+
+    def _get_result(self, key: str) -> tuple | None:
+        result = self._results.get(key)
+        if result is None:
+            return None
+
+        state, pdf_file, expires_at = result
+        if expires_at <= time.monotonic():
+            del self._results[key]
+            return None
+
+        return state, pdf_file
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+
+        return self._executor
+
+
+shopping_list_renderer = ShoppingListRenderer(
+    settings.SHOPPING_LIST_RENDER_WORKERS,
+    settings.SHOPPING_LIST_RENDER_QUEUE_SIZE,
+)
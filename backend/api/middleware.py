@@ -0,0 +1,139 @@
+import heapq
+import logging
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+class QueryStatistics:
+    """Статистика SQL-запросов одного HTTP-запроса."""
+
+    def __init__(self, repeat_threshold: int):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = defaultdict(int)
+        self.repeated = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            self.statements.append((duration, sql))
+
+            shape = PLACEHOLDERS.sub('%s, ...', sql)
+            self.shapes[shape] += 1
+            if (self.shapes[shape] == self.repeat_threshold
+                    and shape not in self.repeated):
+                self.repeated[shape] = find_serializer_field()
+
+    def slowest(self, limit: int) -> list[tuple[float, str]]:
+        return heapq.nlargest(limit, self.statements)
+
+
+def find_serializer_field() -> str | None:
+    """
+    Возвращает поле сериализатора, из которого выполняется запрос.
+
+    Вызывается только при обнаружении повторяющегося запроса,
+    поэтому обход стека не влияет на обычные запросы.
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, BaseSerializer):
+            field = frame.f_locals.get('field')
+            if isinstance(field, Field):
+                return f'{type(instance).__name__}.{field.field_name}'
+        elif isinstance(instance, Field) and instance.parent is not None:
+            return f'{type(instance.parent).__name__}.{instance.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Учитывает число и длительность SQL-запросов для доли HTTP-запросов.
+
+    Доля задаётся настройкой SQL_INSTRUMENTATION_SAMPLE_RATE, при нулевом
+    значении middleware ничего не делает. Повторы запроса одной формы
+    (признак N+1) записываются в лог вместе с представлением и полем
+    сериализатора, а при включённой SQL_INSTRUMENTATION_SERVER_TIMING
+    статистика возвращается в заголовке Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.SQL_INSTRUMENTATION_SAMPLE_RATE
+        self.server_timing = settings.SQL_INSTRUMENTATION_SERVER_TIMING
+        self.slow_queries = settings.SQL_INSTRUMENTATION_SLOW_QUERIES
+        self.repeat_threshold = settings.SQL_INSTRUMENTATION_REPEAT_THRESHOLD
+
+    def __call__(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        statistics = QueryStatistics(self.repeat_threshold)
+        with connection.execute_wrapper(statistics):
+            response = self.get_response(request)
+
+        self.report(request, statistics)
+        if self.server_timing:
+            response['Server-Timing'] = self.server_timing_header(statistics)
+
+        return response
+
+    def report(self, request, statistics: QueryStatistics):
+        match = request.resolver_match
+        view = match.view_name if match is not None else request.path
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                '%s %s: %d запросов за %.2f мс, самые медленные: %s',
+                request.method,
+                view,
+                statistics.count,
+                statistics.duration * 1000,
+                statistics.slowest(self.slow_queries)
+            )
+        for shape, field in statistics.repeated.items():
+            logger.warning(
+                'N+1: %s %s (%s) выполнил %d одинаковых запросов: %s',
+                request.method,
+                view,
+                field or 'поле сериализатора не определено',
+                statistics.shapes[shape],
+                shape
+            )
+
+    def server_timing_header(self, statistics: QueryStatistics) -> str:
+        metrics = [
+            f'db;dur={statistics.duration * 1000:.2f};'
+            f'desc="{statistics.count} queries"'
+        ]
+        for index, (duration, _) in enumerate(
+            statistics.slowest(self.slow_queries)
+        ):
+            metrics.append(f'db-slow-{index};dur={duration * 1000:.2f}')
+        if statistics.repeated:
+            repeated = max(
+                statistics.shapes[shape] for shape in statistics.repeated
+            )
+            metrics.append(f'db-repeated;desc="{repeated} queries"')
+
+        return ', '.join(metrics)
@@ -1,5 +1,49 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class LimitCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class OptionalCursorPagination(LimitPageNumberPagination):
+    """
+    Постраничная пагинация, переключающаяся на курсорную
+    при наличии в запросе параметра cursor.
+    """
+    cursor_query_param = 'cursor'
+    cursor_pagination_class = LimitCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.cursor_paginator = self.cursor_pagination_class()
+        return self.cursor_paginator.paginate_queryset(
+            queryset,
+            request,
+            view
+        )
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class UserCursorPagination(LimitCursorPagination):
+    ordering = 'id'
+
+
+class OptionalUserCursorPagination(OptionalCursorPagination):
+    """
+    Пагинация пользователей: курсорные и обычные страницы
+    упорядочены одинаково, по возрастанию id.
+    """
+    cursor_pagination_class = UserCursorPagination
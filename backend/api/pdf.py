@@ -0,0 +1,11 @@
+from weasyprint import HTML
+
+
+def write_pdf(html: str) -> bytes:
+    """
+    Рендерит HTML в PDF.
+
+    Модуль не зависит от Django, чтобы функцию можно было выполнять
+    в отдельном процессе пула без настройки проекта.
+    """
+    return HTML(string=html).write_pdf()
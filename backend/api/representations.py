@@ -0,0 +1,89 @@
+from recipes.documents import ensure_documents
+
+# Аннотации RecipeViewSet.get_queryset для авторизованного пользователя.
+USER_ROW_FIELDS = (
+    'is_favorited',
+    'is_in_shopping_cart',
+    'author_is_subscribed',
+)
+
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+
+
+def get_recipe_rows(queryset, user):
+    """Строки рецептов для represent_recipes вместо объектов модели."""
+    fields = (
+        'id', 'document_version', 'document__document', 'document__version'
+    )
+    if not user.is_anonymous:
+        fields += USER_ROW_FIELDS
+
+    return queryset.select_related(None).prefetch_related(None).values(
+        *fields
+    )
+
+
+def represent_recipes(rows, request, rendition: str | None = None) -> list:
+    """
+    Представление рецептов, совпадающее с ExtendedRecipeSerializer.
+
+    Документы рецептов читаются из recipes.RecipeDocument, поверх них
+    добавляются только поля текущего пользователя. Недостающие и
+    устаревшие документы собираются и сохраняются. rendition задает
+    копию изображения, которую отдавать вместо оригинала, если она есть.
+    """
+    rows = list(rows)
+    stale = [
+        row for row in rows
+        if row['document__version'] != row['document_version']
+    ]
+    documents = ensure_documents(
+        [row['id'] for row in stale],
+        [row['id'] for row in stale if row['document__version'] is not None]
+    ) if stale else {}
+
+    return [
+        _represent_recipe(
+            row,
+            documents.get(row['id']) or row['document__document'],
+            request,
+            rendition
+        )
+        for row in rows
+    ]
+
+
+def _represent_recipe(row, document, request, rendition) -> dict:
+    author = document['author']
+    if author is not None:
+        author = dict(zip(AUTHOR_FIELDS, author))
+        author['is_subscribed'] = row.get('author_is_subscribed', False)
+
+    return {
+        'id': row['id'],
+        'name': document['name'],
+        'author': author,
+        'cooking_time': document['cooking_time'],
+        'text': document['text'],
+        'image': _image_url(document['image'], request, rendition),
+        'ingredients': [
+            dict(zip(INGREDIENT_FIELDS, ingredient))
+            for ingredient in document['ingredients']
+        ],
+        'tags': [dict(zip(TAG_FIELDS, tag)) for tag in document['tags']],
+        'is_favorited': row.get('is_favorited', False),
+        'is_in_shopping_cart': row.get('is_in_shopping_cart', False),
+    }
+
+
+def _image_url(urls, request, rendition: str | None) -> str | None:
+    if urls is None:
+        return None
+
+    url = urls.get(rendition) or urls['original']
+    if request is not None:
+        return request.build_absolute_uri(url)
+
+    return url
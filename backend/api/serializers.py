@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractBaseUser
-from django.db.models import F
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.forms import ValidationError
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
@@ -8,6 +9,57 @@ from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
 from rest_framework import serializers
 from users.models import Subscription, User
 
+DOES_NOT_EXIST = (
+    serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+)
+INCORRECT_TYPE = (
+    serializers.PrimaryKeyRelatedField.default_error_messages['incorrect_type']
+)
+
+RECIPE_IDS_LIMIT = 100
+
+# Поля, которые читают RecipeSerializer и SubscriptionRecipeSerializer.
+RECIPE_MINIFIED_FIELDS = (
+    'id', 'name', 'image', 'image_renditions', 'cooking_time'
+)
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта, отдающее ссылку на уменьшенную копию.
+
+    Если копия еще не создана, возвращается ссылка на оригинал.
+    При заданных actions копия используется только в этих действиях
+    представления, в остальных отдается оригинал.
+    """
+
+    def __init__(self, rendition, actions=None, **kwargs):
+        self.rendition = rendition
+        self.actions = actions
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        view = self.context.get('view')
+        if self.actions is not None and (
+            view is None or getattr(view, 'action', None) not in self.actions
+        ):
+            return super().to_representation(value)
+
+        renditions = getattr(value.instance, 'image_renditions', None) or {}
+        name = renditions.get(self.rendition)
+        if name is None:
+            return super().to_representation(value)
+
+        url = value.storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+
+        return url
+
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -48,7 +100,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -57,7 +109,7 @@ class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField(rendition='thumbnail')
 
     class Meta:
         model = Recipe
@@ -69,11 +121,32 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для массового добавления в избранное и покупки."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_IDS_LIMIT
+    )
+
+    def validate_ids(self, ids):
+        objects = Recipe.objects.only(*RECIPE_MINIFIED_FIELDS).in_bulk(ids)
+
+        for pk in ids:
+            if pk not in objects:
+                raise serializers.ValidationError(
+                    DOES_NOT_EXIST.format(pk_value=pk)
+                )
+
+        return [objects[pk] for pk in dict.fromkeys(ids)]
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True)
+    # Значения проверяются в validate_tags, чтобы ошибки были плоским
+    # списком, как у PrimaryKeyRelatedField.
+    tags = serializers.ListField()
     image = Base64ImageField()
 
     class Meta:
@@ -89,7 +162,40 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'tags'
         )
 
+    def validate_tags(self, tags):
+        pks = []
+        for value in tags:
+            try:
+                # Как и PrimaryKeyRelatedField, не принимаем True и False.
+                if isinstance(value, bool):
+                    raise TypeError
+                pks.append(int(value))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError(
+                    INCORRECT_TYPE.format(data_type=type(value).__name__)
+                )
+
+        objects = Tag.objects.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                raise serializers.ValidationError(
+                    DOES_NOT_EXIST.format(pk_value=pk)
+                )
+
+        return [objects[pk] for pk in pks]
+
     def validate_ingredients(self, ingredients):
+        objects = Ingredient.objects.in_bulk(
+            [item['id'] for item in ingredients]
+        )
+        errors = [
+            {} if item['id'] in objects
+            else {'id': [DOES_NOT_EXIST.format(pk_value=item['id'])]}
+            for item in ingredients
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
         if not ingredients:
             raise ValidationError(
                 'Необходимо выбрать ингредиенты.'
@@ -104,6 +210,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'Ингредиенты в рецепте должны быть уникальными.'
             )
+
+        for item in ingredients:
+            item['id'] = objects[item['id']]
+
         return ingredients
 
     def validate_cooking_time(self, cooking_time):
@@ -114,25 +224,62 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return cooking_time
 
+    @staticmethod
+    def _get_amounts(ingredients) -> dict:
+        amounts = {}
+        for item in ingredients:
+            ingredient = item['id']
+            amounts[ingredient] = amounts.get(ingredient, 0) + item['amount']
+
+        return amounts
+
     def _create_ingredients(self, ingredients, recipe):
-        recipe_ingredients = {}
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            amount = ingredient['amount']
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=amount
+            )
+            for ingredient, amount in self._get_amounts(ingredients).items()
+        )
 
-            if ingredient_id in recipe_ingredients:
-                recipe_ingredients[ingredient_id].amount += F('amount')
-            else:
-                recipe_ingredients[ingredient_id] = RecipeIngredient(
+    def _update_ingredients(self, ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к новому списку, изменяя только
+        отличающиеся строки. Возвращает True, если что-то изменилось.
+        """
+        amounts = {
+            ingredient.pk: (ingredient, amount)
+            for ingredient, amount in self._get_amounts(ingredients).items()
+        }
+        to_update = []
+        to_delete = []
+
+        for recipe_ingredient in recipe.recipe_ingredient.all():
+            new = amounts.pop(recipe_ingredient.ingredient_id, None)
+            if new is None:
+                to_delete.append(recipe_ingredient.pk)
+            elif recipe_ingredient.amount != new[1]:
+                recipe_ingredient.amount = new[1]
+                to_update.append(recipe_ingredient)
+
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if amounts:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
                     recipe=recipe,
-                    ingredient=ingredient_id,
+                    ingredient=ingredient,
                     amount=amount
                 )
+                for ingredient, amount in amounts.values()
+            )
 
-        RecipeIngredient.objects.bulk_create(
-            list(recipe_ingredients.values())
-        )
+        return bool(to_delete or to_update or amounts)
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
 
@@ -152,19 +299,27 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
 
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-
-        self._create_ingredients(ingredients, instance)
+        if self._update_ingredients(ingredients, instance):
+            # Ингредиенты могли быть предзагружены представлением.
+            getattr(instance, '_prefetched_objects_cache', {}).pop(
+                'recipe_ingredient', None
+            )
 
         instance.tags.set(tags)
-
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            'recipe_ingredient__ingredient'
+        )
+
         return ExtendedRecipeSerializer(
             instance,
             context={'request': self.context.get('request')}).data
@@ -269,21 +424,24 @@ class CustomUserSerializer(UserSerializer):
             'username',
             'first_name',
             'last_name',
-            'password',
             'is_subscribed'
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         request = self.context.get('request')
-        user = request.user
 
         if not request or request.user.is_anonymous:
             return False
 
-        return Subscription.objects.filter(
-            user=user,
-            author=obj
-        ).exists()
+        if not hasattr(request, 'followed_authors'):
+            request.followed_authors = set(
+                request.user.subscriber.values_list('author_id', flat=True)
+            )
+
+        return obj.id in request.followed_authors
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -305,6 +463,9 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         user = self.context.get('request').user
         if not user:
             return False
@@ -313,7 +474,11 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes = obj.recipes.all()
+
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = obj.recipes.all()
 
         context = {'request': request}
 
@@ -324,10 +489,12 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         ).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 
 class SubscriptionRecipeSerializer(serializers.ModelSerializer):
+    image = RecipeImageField(rendition='thumbnail', read_only=True)
+
     class Meta:
         model = Recipe
         fields = (
@@ -343,7 +510,7 @@ class ExtendedRecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField(rendition='card', actions=('list',))
     author = CustomUserSerializer(read_only=True)
 
     class Meta:
@@ -361,30 +528,36 @@ class ExtendedRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed') and instance.author:
+            instance.author.is_subscribed = instance.author_is_subscribed
+
+        return super().to_representation(instance)
+
     @staticmethod
     def get_ingredients(obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
+        ingredients = obj.recipe_ingredient.all()
 
         return IngredientInRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         user: AbstractBaseUser = self.context.get('request').user
 
         if user.is_anonymous:
             return False
 
-        if Favourite.objects.filter(user=user, recipe=obj).exists():
-            return True
-
-        return False
+        return Favourite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         user: AbstractBaseUser = self.context.get('request').user
 
         if user.is_anonymous:
             return False
 
-        if ShoppingCart.objects.filter(user=user, recipe=obj):
-            return True
-
-        return False
+        return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                            Tag)
+from users.models import User
+
+from .cache import recipe_response_cache, shopping_list_pdf_cache
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_shopping_list_pdf(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(
+        lambda: shopping_list_pdf_cache.invalidate_user(user_id)
+    )
+
+
+def invalidate_responses(namespaces):
+    namespaces = list(namespaces)
+    transaction.on_commit(
+        lambda: recipe_response_cache.invalidate(namespaces)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_responses(sender, instance, raw, **kwargs):
+    if raw:
+        return
+
+    # Теги нового рецепта учитываются при их добавлении.
+    invalidate_responses((
+        f'recipe:{instance.pk}',
+        f'author:{instance.author_id}',
+        'recipes',
+    ))
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe_responses(sender, instance, **kwargs):
+    # Связи с тегами удаляются каскадно, без сигнала m2m_changed.
+    invalidate_responses((
+        f'recipe:{instance.pk}',
+        f'author:{instance.author_id}',
+        'recipes',
+        *(f'tag:{slug}' for slug in instance.tags.values_list(
+            'slug', flat=True
+        )),
+    ))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient_responses(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        invalidate_responses((f'recipe:{instance.recipe_id}',))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_responses(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    if action == 'pre_clear':
+        pk_set = set(
+            instance.recipes.values_list('pk', flat=True) if reverse
+            else instance.tags.values_list('pk', flat=True)
+        )
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    if not pk_set:
+        return
+
+    if reverse:
+        recipe_ids, slugs = pk_set, (instance.slug,)
+    else:
+        recipe_ids = (instance.pk,)
+        slugs = Tag.objects.filter(pk__in=pk_set).values_list(
+            'slug', flat=True
+        )
+
+    invalidate_responses((
+        *(f'recipe:{pk}' for pk in recipe_ids),
+        *(f'tag:{slug}' for slug in slugs),
+    ))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_responses(sender, instance, **kwargs):
+    invalidate_responses(('tags',))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_responses(sender, instance, **kwargs):
+    invalidate_responses(('ingredients',))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, update_fields, **kwargs):
+    # Вход пользователя обновляет только last_login.
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+
+    invalidate_responses((f'author:{instance.pk}',))
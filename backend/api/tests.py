@@ -0,0 +1,1120 @@
+import base64
+import io
+import shutil
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.documents import (build_documents, ensure_documents,
+                               invalidate_documents)
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import ingredient_index
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, APITestCase
+from users.models import Subscription, User
+
+from .cache import ShoppingListPdfCache, shopping_list_pdf_cache
+from .jobs import ShoppingListRenderer
+from .serializers import (DOES_NOT_EXIST, INCORRECT_TYPE,
+                          ExtendedRecipeSerializer)
+from .views import RecipeViewSet
+
+
+def make_image(color: str) -> SimpleUploadedFile:
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), color).save(buffer, 'PNG')
+
+    return SimpleUploadedFile('image.png', buffer.getvalue(), 'image/png')
+
+
+def make_base64_image(color: str) -> str:
+    content = base64.b64encode(make_image(color).read()).decode()
+
+    return f'data:image/png;base64,{content}'
+
+
+def create_user(username: str, **fields) -> User:
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='pass',
+        **fields
+    )
+
+
+def create_recipe(author, tags=(), ingredients=(), **fields) -> Recipe:
+    fields.setdefault('name', 'Рецепт')
+    fields.setdefault('text', 'Описание')
+    fields.setdefault('cooking_time', 10)
+    fields.setdefault('image', make_image('white'))
+    recipe = Recipe.objects.create(author=author, **fields)
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for amount, ingredient in enumerate(ingredients, 1)
+    )
+
+    return recipe
+
+
+class MediaTestCase(APITestCase):
+    """Тесты, сохраняющие изображения во временный каталог."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+
+class RecipeRepresentationTest(MediaTestCase):
+    """
+    Ответы чтения рецептов совпадают побайтно с ответами
+    ExtendedRecipeSerializer и стандартного JSONRenderer.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user(
+            'author', first_name='Имя', last_name='Фамилия'
+        )
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+                ('Ужин', '#8775D2', 'dinner'),
+            )
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        cls.recipes = [
+            create_recipe(
+                cls.author,
+                tags,
+                ingredients,
+                name='Борщ',
+                text='Разделитель строк \u2028, "кавычки" и 😀',
+                cooking_time=60,
+                image=make_image('red')
+            ),
+            create_recipe(
+                cls.user,
+                tags[1:],
+                ingredients[1:],
+                name='Омлет',
+                text='Яйца и молоко',
+                image=make_image('yellow')
+            ),
+            create_recipe(
+                None,
+                tags[2:],
+                ingredients[2:],
+                name='Рецепт без автора',
+                text='Автор удален',
+                cooking_time=5,
+                image=make_image('green')
+            ),
+        ]
+
+        Subscription.objects.create(user=cls.user, author=cls.author)
+        Favourite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[2])
+
+    def render_with_serializer(self, url, user, action, pk=None) -> bytes:
+        view = RecipeViewSet(
+            action_map={'get': action}, format_kwarg=None, kwargs={}
+        )
+        view.request = view.initialize_request(APIRequestFactory().get(url))
+        view.request.user = user
+        queryset = view.filter_queryset(view.get_queryset())
+        context = view.get_serializer_context()
+
+        if action == 'list':
+            data = view.get_paginated_response(
+                ExtendedRecipeSerializer(
+                    view.paginate_queryset(queryset),
+                    many=True,
+                    context=context
+                ).data
+            ).data
+        else:
+            data = ExtendedRecipeSerializer(
+                queryset.get(pk=pk), context=context
+            ).data
+
+        return JSONRenderer().render(data)
+
+    def assert_same_responses(self, user):
+        if user.is_authenticated:
+            self.client.force_authenticate(user)
+
+        for url in ('/api/recipes/', '/api/recipes/?tags=lunch&limit=2'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.content,
+                    self.render_with_serializer(url, user, 'list')
+                )
+
+        for recipe in self.recipes:
+            url = f'/api/recipes/{recipe.pk}/'
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response.content,
+                    self.render_with_serializer(
+                        url, user, 'retrieve', recipe.pk
+                    )
+                )
+
+    def test_anonymous(self):
+        self.assert_same_responses(AnonymousUser())
+
+    def test_authenticated(self):
+        self.assert_same_responses(self.user)
+
+
+class CounterTest(MediaTestCase):
+    """
+    Денормализованные счетчики следуют за изменениями и не затираются
+    сохранением объектов.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipe = create_recipe(cls.author, [cls.tag], [cls.ingredient])
+
+    def recipe_data(self) -> dict:
+        return {
+            'name': 'Новое название',
+            'text': 'Новое описание',
+            'cooking_time': 15,
+            'image': make_base64_image('blue'),
+            'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+        }
+
+    def test_single_toggles(self):
+        self.client.force_authenticate(self.reader)
+        for path, field in (
+            ('favorite', 'favorites_count'),
+            ('shopping_cart', 'shopping_cart_count'),
+        ):
+            with self.subTest(path=path):
+                url = f'/api/recipes/{self.recipe.pk}/{path}/'
+
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, field), 1)
+
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, field), 0)
+
+    def test_author_counters(self):
+        self.client.force_authenticate(self.reader)
+        url = f'/api/users/{self.author.pk}/subscribe/'
+
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+        self.client.force_authenticate(self.author)
+        response = self.client.post(
+            '/api/recipes/', self.recipe_data(), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+        response = self.client.delete(f'/api/recipes/{response.json()["id"]}/')
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_recipe_update_keeps_favorites_count(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            self.recipe_data(),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.name, 'Новое название')
+
+    def test_stale_recipe_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favourite.objects.create(user=self.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+
+        recipe.cooking_time = 20
+        recipe.save()
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.shopping_cart_count, 1)
+        self.assertEqual(recipe.cooking_time, 20)
+
+    def test_stale_user_save_keeps_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        self.client.force_authenticate(self.reader)
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        create_recipe(author)
+
+        author.first_name = 'Имя'
+        author.save()
+
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 2)
+        self.assertEqual(author.first_name, 'Имя')
+
+
+class TagFilterTest(MediaTestCase):
+    """Фильтр по тегам следует за изменением тегов рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.breakfast, cls.lunch = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipe = create_recipe(
+            cls.author, [cls.breakfast], [cls.ingredient]
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+
+    def filtered_ids(self, slug) -> list:
+        response = self.client.get(f'/api/recipes/?tags={slug}')
+        self.assertEqual(response.status_code, 200)
+
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_filter_after_tag_edit(self):
+        self.assertEqual(self.filtered_ids('breakfast'), [self.recipe.pk])
+
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'name': self.recipe.name,
+                'text': self.recipe.text,
+                'cooking_time': self.recipe.cooking_time,
+                'image': make_base64_image('blue'),
+                'tags': [self.lunch.pk],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.filtered_ids('breakfast'), [])
+        self.assertEqual(self.filtered_ids('lunch'), [self.recipe.pk])
+
+
+class RecipeDocumentTest(MediaTestCase):
+    """Ответы не отдают устаревшие документы рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipe = create_recipe(cls.author, (), [cls.ingredient])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get_recipe(self) -> dict:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        return response.json()
+
+    def get_amount(self) -> int:
+        return self.get_recipe()['ingredients'][0]['amount']
+
+    def test_direct_ingredient_save(self):
+        self.assertEqual(self.get_amount(), 1)
+
+        recipe_ingredient = RecipeIngredient.objects.get(recipe=self.recipe)
+        recipe_ingredient.amount = 7
+        recipe_ingredient.save()
+
+        self.assertEqual(self.get_amount(), 7)
+
+    def test_bulk_update_with_invalidation(self):
+        self.assertEqual(self.get_amount(), 1)
+
+        RecipeIngredient.objects.filter(recipe=self.recipe).update(amount=99)
+        invalidate_documents(pk=self.recipe.pk)
+
+        self.assertEqual(self.get_amount(), 99)
+
+    def test_rebuild_started_before_write(self):
+        # Документ собран по прежнему состоянию рецепта и сохранен
+        # после изменения, отметившего документы устаревшими.
+        stale = build_documents((self.recipe.pk,))
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='Новое')
+        invalidate_documents(pk=self.recipe.pk)
+        with mock.patch(
+            'recipes.documents.build_documents', return_value=stale
+        ):
+            ensure_documents((self.recipe.pk,))
+
+        self.assertEqual(self.get_recipe()['name'], 'Новое')
+
+    def test_rebuild_finished_after_newer_one(self):
+        stale = build_documents((self.recipe.pk,))
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='Новое')
+        invalidate_documents(pk=self.recipe.pk)
+        self.assertEqual(self.get_recipe()['name'], 'Новое')
+
+        with mock.patch(
+            'recipes.documents.build_documents', return_value=stale
+        ):
+            ensure_documents((self.recipe.pk,), (self.recipe.pk,))
+
+        self.assertEqual(self.get_recipe()['name'], 'Новое')
+
+
+class RecipeTagValidationTest(MediaTestCase):
+    """Ошибки тегов рецепта возвращаются плоским списком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+
+    def post_recipe(self, tags):
+        return self.client.post(
+            '/api/recipes/',
+            {
+                'name': 'Омлет',
+                'text': 'Яйца',
+                'cooking_time': 10,
+                'image': make_base64_image('blue'),
+                'tags': tags,
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+            },
+            format='json'
+        )
+
+    def test_invalid_tags(self):
+        cases = (
+            ([True], [INCORRECT_TYPE.format(data_type='bool')]),
+            (['abc'], [INCORRECT_TYPE.format(data_type='str')]),
+            ([None], [INCORRECT_TYPE.format(data_type='NoneType')]),
+            (
+                [self.tag.pk, 999],
+                [DOES_NOT_EXIST.format(pk_value=999)]
+            ),
+        )
+        for tags, errors in cases:
+            with self.subTest(tags=tags):
+                response = self.post_recipe(tags)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'tags': errors})
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_valid_tags(self):
+        response = self.post_recipe([str(self.tag.pk)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [tag['id'] for tag in response.json()['tags']], [self.tag.pk]
+        )
+
+
+class RecipeSelectionTest(MediaTestCase):
+    """Массовое добавление в избранное и список покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = [create_recipe(cls.author) for _ in range(3)]
+        cls.ids = [recipe.pk for recipe in cls.recipes]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.reader)
+
+    def get_counts(self, field) -> list:
+        return list(
+            Recipe.objects.filter(pk__in=self.ids).order_by('pk').values_list(
+                field, flat=True
+            )
+        )
+
+    def test_add_and_remove(self):
+        for url, field in (
+            ('/api/recipes/favorite/', 'favorites_count'),
+            ('/api/recipes/shopping_cart/', 'shopping_cart_count'),
+        ):
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, {'ids': self.ids}, format='json'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(self.get_counts(field), [1, 1, 1])
+
+                response = self.client.post(
+                    url, {'ids': self.ids[:1]}, format='json'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(self.get_counts(field), [1, 1, 1])
+
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.delete(
+                        url, {'ids': self.ids[:2]}, format='json'
+                    )
+                self.assertEqual(response.status_code, 204)
+                self.assertEqual(self.get_counts(field), [0, 0, 1])
+
+                statements = [
+                    query['sql'].split()[0]
+                    for query in context.captured_queries
+                ]
+                self.assertEqual(statements.count('DELETE'), 1)
+                self.assertEqual(statements.count('UPDATE'), 1)
+
+    def test_cart_changes_invalidate_pdf_once(self):
+        for method in ('post', 'delete'):
+            with self.subTest(method=method), mock.patch.object(
+                shopping_list_pdf_cache, 'invalidate_user'
+            ) as invalidate_user, self.captureOnCommitCallbacks(
+                execute=True
+            ):
+                getattr(self.client, method)(
+                    '/api/recipes/shopping_cart/',
+                    {'ids': self.ids},
+                    format='json'
+                )
+
+            invalidate_user.assert_called_once_with(self.reader.pk)
+
+
+class SubscriptionListTest(MediaTestCase):
+    """Постраничный список подписок с ограничением рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.authors = [create_user(f'author{number}') for number in range(3)]
+        for author in reversed(cls.authors):
+            Subscription.objects.create(user=cls.reader, author=author)
+            for _ in range(3):
+                create_recipe(author)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.reader)
+
+    def test_pages_are_ordered(self):
+        ids = []
+        url = '/api/users/subscriptions/?limit=2'
+        while url:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', UnorderedObjectListWarning)
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [author['id'] for author in response.json()['results']]
+            url = response.json()['next']
+
+        self.assertEqual(ids, [author.pk for author in self.authors])
+
+    def test_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=2'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        for author in response.json()['results']:
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(author['recipes_count'], 3)
+            self.assertTrue(author['is_subscribed'])
+
+
+class ResponseCacheTest(MediaTestCase):
+    """Кэш анонимных ответов сбрасывается только для измененных данных."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.breakfast, cls.lunch = (
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'lunch'),
+            )
+        )
+        cls.recipe = create_recipe(cls.author, [cls.breakfast], name='Омлет')
+        cls.other = create_recipe(
+            create_user('other'), [cls.breakfast], name='Каша'
+        )
+
+    def get(self, url) -> dict:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        return response.json()
+
+    def get_names(self, url) -> list:
+        return sorted(recipe['name'] for recipe in self.get(url)['results'])
+
+    def test_repeated_requests_skip_database(self):
+        for url in (
+            '/api/recipes/',
+            '/api/recipes/?tags=breakfast',
+            f'/api/recipes/{self.recipe.pk}/',
+        ):
+            with self.subTest(url=url):
+                data = self.get(url)
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.get(url), data)
+
+    def test_recipe_change(self):
+        detail = f'/api/recipes/{self.recipe.pk}/'
+        other_detail = f'/api/recipes/{self.other.pk}/'
+        self.get(detail)
+        self.get(other_detail)
+        self.assertEqual(self.get_names('/api/recipes/'), ['Каша', 'Омлет'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Яичница'
+            self.recipe.save()
+
+        self.assertEqual(self.get(detail)['name'], 'Яичница')
+        self.assertEqual(
+            self.get_names('/api/recipes/'), ['Каша', 'Яичница']
+        )
+        with self.assertNumQueries(0):
+            self.get(other_detail)
+
+    def test_tag_change(self):
+        self.assertEqual(self.get_names('/api/recipes/?tags=lunch'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(self.lunch)
+
+        self.assertEqual(
+            self.get_names('/api/recipes/?tags=lunch'), ['Омлет']
+        )
+
+    def test_author_change(self):
+        url = f'/api/recipes/?author={self.author.pk}'
+        self.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Имя'
+            self.author.save()
+
+        for recipe in self.get(url)['results']:
+            self.assertEqual(recipe['author']['first_name'], 'Имя')
+
+    def test_authenticated_requests_are_not_cached(self):
+        self.get('/api/recipes/')
+
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as context:
+            self.get('/api/recipes/')
+
+        self.assertTrue(context.captured_queries)
+
+
+class ShoppingListPdfCacheTest(SimpleTestCase):
+    """Вытеснение и удаление файлов из кэша PDF."""
+
+    def test_least_recently_used_evicted(self):
+        cache = ShoppingListPdfCache(max_size=10)
+        cache.set('first', b'1111')
+        cache.set('second', b'2222')
+        cache.get('first')
+        cache.set('third', b'3333')
+
+        self.assertEqual(cache.get('first'), b'1111')
+        self.assertIsNone(cache.get('second'))
+        self.assertEqual(cache.get('third'), b'3333')
+
+    def test_oversized_file_not_stored(self):
+        cache = ShoppingListPdfCache(max_size=4)
+        cache.set('large', b'12345')
+
+        self.assertIsNone(cache.get('large'))
+
+    def test_shared_file_kept_until_last_user_changes(self):
+        cache = ShoppingListPdfCache(max_size=10)
+        cache.get_or_create('key', 1, lambda: b'pdf')
+        cache.get_or_create('key', 2, lambda: b'other')
+
+        cache.invalidate_user(1)
+        self.assertEqual(cache.get('key'), b'pdf')
+
+        cache.invalidate_user(2)
+        self.assertIsNone(cache.get('key'))
+
+
+class ShoppingListDownloadTest(MediaTestCase):
+    """Скачивание списка покупок в разных форматах."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.recipes = [
+            create_recipe(
+                cls.user,
+                ingredients=[
+                    Ingredient.objects.create(name=name, measurement_unit='г')
+                ]
+            )
+            for name in ('Соль', 'Сахар')
+        ]
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[0])
+
+    def setUp(self):
+        super().setUp()
+        shopping_list_pdf_cache.clear()
+        self.addCleanup(shopping_list_pdf_cache.clear)
+        self.client.force_authenticate(self.user)
+
+    def make_renderer(self, max_pending=2) -> ShoppingListRenderer:
+        renderer = ShoppingListRenderer(1, max_pending)
+        renderer._executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(renderer._executor.shutdown)
+        patcher = mock.patch('api.views.shopping_list_renderer', renderer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return renderer
+
+    def download(self, url=None):
+        return self.client.get(url or self.url)
+
+    @mock.patch('api.views.render_shopping_list_pdf', return_value=b'%PDF')
+    def test_pdf_rendered_once_per_cart(self, render):
+        for _ in range(2):
+            response = self.download()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'%PDF')
+        render.assert_called_once()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/recipes/{self.recipes[1].pk}/shopping_cart/'
+            )
+        self.assertEqual(response.status_code, 201)
+
+        self.download()
+        self.assertEqual(render.call_count, 2)
+        self.assertEqual(
+            [name for name, *_ in render.call_args.args[0]],
+            ['Сахар', 'Соль']
+        )
+
+    def test_streamed_formats(self):
+        cases = (
+            ('txt', 'text/plain; charset=utf-8', 'Соль (г) — 1\n'),
+            (
+                'csv',
+                'text/csv; charset=utf-8',
+                'name,amount,measurement_unit\r\nСоль,1,г\r\n'
+            ),
+            (
+                'json',
+                'application/json',
+                '[{"name": "Соль", "amount": 1, "measurement_unit": "г"}]'
+            ),
+        )
+        for shopping_list_format, content_type, content in cases:
+            with self.subTest(format=shopping_list_format):
+                response = self.download(
+                    f'{self.url}?format={shopping_list_format}'
+                )
+
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                self.assertEqual(
+                    b''.join(response.streaming_content).decode(), content
+                )
+
+        response = self.download(f'{self.url}?format=doc')
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('api.jobs.write_pdf', return_value=b'%PDF-async')
+    def test_async_job(self, write_pdf):
+        renderer = self.make_renderer()
+
+        response = self.download(f'{self.url}?async=1')
+        self.assertEqual(response.status_code, 202)
+        job_url = response.json()['url']
+        self.assertEqual(response['Location'], job_url)
+
+        renderer._executor.shutdown(wait=True)
+        response = self.download(job_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'%PDF-async')
+
+        self.download(f'{self.url}?async=1')
+        write_pdf.assert_called_once()
+
+    @mock.patch('api.jobs.write_pdf', side_effect=RuntimeError)
+    def test_failed_job(self, write_pdf):
+        renderer = self.make_renderer()
+
+        job_url = self.download(f'{self.url}?async=1').json()['url']
+        renderer._executor.shutdown(wait=True)
+
+        self.assertEqual(self.download(job_url).status_code, 500)
+
+    def test_unknown_job(self):
+        self.make_renderer()
+
+        response = self.download(f'{self.url}{"0" * 64}/')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_full_queue(self):
+        self.make_renderer(max_pending=0)
+
+        response = self.download(f'{self.url}?async=1')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
+
+class CursorPaginationTest(MediaTestCase):
+    """Курсорные страницы совпадают с обычными и не теряют записей."""
+
+    def walk(self, url) -> list:
+        items = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.json())
+            items += response.json()['results']
+            url = response.json()['next']
+
+        return items
+
+    def list_all(self, url) -> list:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        return response.json()['results']
+
+    def test_users(self):
+        reader = create_user('reader')
+        authors = [create_user(f'author{number}') for number in range(4)]
+        Subscription.objects.create(user=reader, author=authors[1])
+        self.client.force_authenticate(reader)
+
+        users = self.walk('/api/users/?cursor=&limit=2')
+
+        self.assertEqual(users, self.list_all('/api/users/?limit=10'))
+        self.assertEqual(
+            [user['id'] for user in users],
+            [user.pk for user in (reader, *authors)]
+        )
+        self.assertEqual(
+            [user['is_subscribed'] for user in users],
+            [False, False, True, False, False]
+        )
+
+    def test_recipes(self):
+        author = create_user('author')
+        tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        recipes = [
+            create_recipe(author, [tag] if number % 2 else [])
+            for number in range(5)
+        ]
+
+        cases = (
+            ('', recipes),
+            ('&tags=breakfast', recipes[1::2]),
+        )
+        for query, expected in cases:
+            with self.subTest(query=query):
+                found = self.walk(f'/api/recipes/?cursor=&limit=2{query}')
+
+                self.assertEqual(
+                    found, self.list_all(f'/api/recipes/?limit=10{query}')
+                )
+                self.assertEqual(
+                    [recipe['id'] for recipe in found],
+                    [recipe.pk for recipe in reversed(expected)]
+                )
+
+
+class IngredientSearchTest(APITestCase):
+    """Поиск ингредиентов по началу названия и нечеткий поиск."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Сгущённое молоко', 'Мука', 'молоко'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        ingredient_index.invalidate()
+
+    def get_names(self, query) -> list:
+        response = self.client.get(f'/api/ingredients/?{query}')
+        self.assertEqual(response.status_code, 200)
+
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.get_names('name=мол'), ['молоко'])
+
+    def test_fuzzy_search(self):
+        self.assertEqual(
+            self.get_names('name=малоко&match=fuzzy'),
+            ['молоко', 'Сгущённое молоко']
+        )
+        self.assertEqual(
+            self.get_names('name=малоко&match=fuzzy&limit=1'), ['молоко']
+        )
+        self.assertEqual(
+            self.get_names('name=малоко&match=fuzzy&limit=abc'),
+            ['молоко', 'Сгущённое молоко']
+        )
+
+
+class QueryCountTest(MediaTestCase):
+    """Число запросов списков не растет с числом записей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.reader)
+
+    def add_authors(self, count):
+        for _ in range(count):
+            author = create_user(f'author{User.objects.count()}')
+            Subscription.objects.create(user=self.reader, author=author)
+            recipe = create_recipe(author, [self.tag], [self.ingredient])
+            Favourite.objects.create(user=self.reader, recipe=recipe)
+
+    def count_queries(self, url) -> int:
+        # Первый запрос строит документы новых рецептов.
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.add_authors(1)
+        expected = self.count_queries(url)
+
+        self.add_authors(3)
+        self.assertEqual(self.count_queries(url), expected)
+
+    def test_recipe_list(self):
+        self.assert_constant_queries('/api/recipes/')
+
+    def test_subscription_list(self):
+        self.assert_constant_queries(
+            '/api/users/subscriptions/?recipes_limit=1'
+        )
+
+
+class RecipeUserFilterTest(MediaTestCase):
+    """Фильтры избранного и списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.favorite, cls.in_cart, cls.other = (
+            create_recipe(cls.reader) for _ in range(3)
+        )
+        Favourite.objects.create(user=cls.reader, recipe=cls.favorite)
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.in_cart)
+
+    def get_ids(self, query) -> set:
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def test_authenticated(self):
+        self.client.force_authenticate(self.reader)
+        cases = (
+            ('is_favorited=1', {self.favorite.pk}),
+            ('is_favorited=0', {self.in_cart.pk, self.other.pk}),
+            ('is_in_shopping_cart=1', {self.in_cart.pk}),
+            ('is_in_shopping_cart=0', {self.favorite.pk, self.other.pk}),
+            ('is_favorited=1&is_in_shopping_cart=1', set()),
+            ('is_favorited=0&is_in_shopping_cart=0', {self.other.pk}),
+        )
+        for query, ids in cases:
+            with self.subTest(query=query):
+                self.assertEqual(self.get_ids(query), ids)
+
+    def test_anonymous(self):
+        everything = {self.favorite.pk, self.in_cart.pk, self.other.pk}
+        cases = (
+            ('is_favorited=1', set()),
+            ('is_favorited=0', everything),
+            ('is_in_shopping_cart=1', set()),
+            ('is_in_shopping_cart=0', everything),
+        )
+        for query, ids in cases:
+            with self.subTest(query=query):
+                self.assertEqual(self.get_ids(query), ids)
+
+
+class RecipeIngredientUpdateTest(MediaTestCase):
+    """Обновление рецепта изменяет только отличающиеся ингредиенты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Мука', 'Масло')
+        ]
+        cls.recipe = create_recipe(cls.author, (), cls.ingredients[:3])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, amounts):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'name': self.recipe.name,
+                'text': self.recipe.text,
+                'cooking_time': self.recipe.cooking_time,
+                'image': make_base64_image('blue'),
+                'tags': [],
+                'ingredients': [
+                    {'id': self.ingredients[index].pk, 'amount': amount}
+                    for index, amount in amounts
+                ],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        return response.json()
+
+    def get_rows(self) -> dict:
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+
+    def test_changed_rows_only(self):
+        before = self.get_rows()
+
+        data = self.patch(((0, 1), (1, 20), (3, 4)))
+
+        after = self.get_rows()
+        salt, sugar, flour, butter = (
+            ingredient.pk for ingredient in self.ingredients
+        )
+        self.assertEqual(after[salt], before[salt])
+        self.assertEqual(after[sugar], (before[sugar][0], 20))
+        self.assertNotIn(flour, after)
+        self.assertEqual(after[butter][1], 4)
+        self.assertEqual(
+            {item['id']: item['amount'] for item in data['ingredients']},
+            {salt: 1, sugar: 20, butter: 4}
+        )
+
+    def test_unchanged_ingredients_not_written(self):
+        with CaptureQueriesContext(connection) as context:
+            self.patch(((0, 1), (1, 2), (2, 3)))
+
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if RecipeIngredient._meta.db_table in query['sql']
+            and query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+        ]
+        self.assertEqual(writes, [])
@@ -2,8 +2,9 @@ from django.urls import include, path
 from djoser.views import TokenCreateView
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomTokenDestroyView, IngredientViewSet, RecipeViewSet,
-                    SubscriptionListViewSet, TagViewSet, subscribe)
+from .views import (CustomTokenDestroyView, CustomUserViewSet,
+                    IngredientViewSet, RecipeViewSet, SubscriptionListViewSet,
+                    TagViewSet, subscribe)
 
 app_name = 'api'
 
@@ -29,6 +30,11 @@ router.register(
     SubscriptionListViewSet,
     basename='subscriptions'
 )
+router.register(
+    r'users',
+    CustomUserViewSet,
+    basename='users'
+)
 
 urlpatterns = [
     path(r'', include(router.urls)),
@@ -41,5 +47,4 @@ urlpatterns = [
     path('users/<int:pk>/subscribe/',
          subscribe,
          name='follow-author'),
-    path('', include('djoser.urls')),
 ]
@@ -1,8 +1,17 @@
+import csv
+import hashlib
+import json
+from typing import Iterable, Iterator
+
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
-from django.http import HttpResponse
-from recipes.models import RecipeIngredient
-from weasyprint import HTML
+from django.db.models import (F, OuterRef, Prefetch, QuerySet, Subquery, Sum,
+                              Value)
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from recipes.models import Recipe, RecipeIngredient
+from rest_framework.request import Request
+
+from .pdf import write_pdf
 
 User = get_user_model()
 
@@ -18,15 +27,103 @@ def get_shopping_list(user: User) -> dict:
             'ingredient__name',
             'amount',
             'ingredient__measurement_unit'
+        ).order_by(
+            'ingredient__name'
+        )
+
+
+def get_shopping_list_digest(ingredients: list) -> str:
+    return hashlib.sha256(repr(ingredients).encode()).hexdigest()
+
+
+def annotate_subscriptions(queryset: QuerySet, request: Request) -> QuerySet:
+    recipes = Recipe.objects.all()
+    recipes_limit = request.query_params.get('recipes_limit')
+
+    if recipes_limit and recipes_limit.isdigit():
+        recipes = recipes.filter(
+            id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:int(recipes_limit)]
+            )
         )
 
+    return queryset.annotate(
+        is_subscribed=Value(True),
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+    )
+
+
+def render_shopping_list_html(ingredients: list) -> str:
+    return render_to_string(
+        'recipes/shopping_list.html',
+        {'ingredients': ingredients}
+    )
+
 
-def render_pdf_response(html: str) -> HttpResponse:
-    html_template = HTML(string=html)
-    pdf_file = html_template.write_pdf()
+def render_shopping_list_pdf(ingredients: list) -> bytes:
+    return write_pdf(render_shopping_list_html(ingredients))
 
+
+def pdf_response(pdf_file: bytes) -> HttpResponse:
     response = HttpResponse(pdf_file, content_type='application/pdf;')
     response['Content-Disposition'] = 'inline; filename=shopping_list.pdf'
     response['Content-Transfer-Encoding'] = 'binary'
 
     return response
+
+
+class _Echo:
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_shopping_list_txt(ingredients: Iterable) -> Iterator[str]:
+    for name, amount, measurement_unit in ingredients:
+        yield f'{name} ({measurement_unit}) — {amount}\n'
+
+
+def stream_shopping_list_csv(ingredients: Iterable) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for row in ingredients:
+        yield writer.writerow(row)
+
+
+def stream_shopping_list_json(ingredients: Iterable) -> Iterator[str]:
+    separator = ''
+    yield '['
+    for name, amount, measurement_unit in ingredients:
+        row = {
+            'name': name,
+            'amount': amount,
+            'measurement_unit': measurement_unit,
+        }
+        yield separator + json.dumps(row, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOPPING_LIST_STREAMS = {
+    'txt': ('text/plain; charset=utf-8', stream_shopping_list_txt),
+    'csv': ('text/csv; charset=utf-8', stream_shopping_list_csv),
+    'json': ('application/json', stream_shopping_list_json),
+}
+
+
+def shopping_list_stream_response(ingredients: Iterable,
+                                  shopping_list_format: str
+                                  ) -> StreamingHttpResponse:
+    content_type, stream = SHOPPING_LIST_STREAMS[shopping_list_format]
+
+    response = StreamingHttpResponse(
+        stream(ingredients),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=shopping_list.{shopping_list_format}'
+    )
+
+    return response
@@ -1,27 +1,40 @@
 from http import HTTPStatus
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser import utils
-from djoser.views import TokenDestroyView
-from recipes.models import Ingredient, Recipe, Tag
+from djoser.views import TokenDestroyView, UserViewSet
+from recipes.counters import refresh as refresh_counter
+from recipes.models import Favourite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.search import (FUZZY_LIMIT, MAX_FUZZY_LIMIT,
+                            fuzzy_search_ingredients, ingredient_index)
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from users.models import Subscription, User
 
+from .cache import (get_recipe_data_namespaces, get_recipe_list_namespaces,
+                    recipe_response_cache, shopping_list_pdf_cache)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPageNumberPagination
+from .jobs import shopping_list_renderer
+from .pagination import (LimitPageNumberPagination, OptionalCursorPagination,
+                         OptionalUserCursorPagination, UserCursorPagination)
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
-from .serializers import (ExtendedRecipeSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeSerializer,
+from .representations import get_recipe_rows, represent_recipes
+from .serializers import (RECIPE_MINIFIED_FIELDS, ExtendedRecipeSerializer,
+                          IngredientSerializer, RecipeCreateSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
                           SubscribeSerializer, SubscriptionSerializer,
                           TagSerializer)
-from .utils import get_shopping_list, render_pdf_response
+from .utils import (SHOPPING_LIST_STREAMS, annotate_subscriptions,
+                    get_shopping_list, get_shopping_list_digest, pdf_response,
+                    render_shopping_list_html, render_shopping_list_pdf,
+                    shopping_list_stream_response)
 
 
 class IngredientViewSet(ReadOnlyModelViewSet):
@@ -31,6 +44,33 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+
+        if name is None:
+            return super().list(request, *args, **kwargs)
+
+        if request.query_params.get('match') == 'fuzzy':
+            ingredients = fuzzy_search_ingredients(
+                name,
+                self._get_limit(request)
+            )
+        else:
+            ingredients = ingredient_index.search(name)
+
+        serializer = self.get_serializer(ingredients, many=True)
+
+        return Response(serializer.data)
+
+    @staticmethod
+    def _get_limit(request):
+        try:
+            limit = int(request.query_params.get('limit', FUZZY_LIMIT))
+        except ValueError:
+            return FUZZY_LIMIT
+
+        return min(max(limit, 1), MAX_FUZZY_LIMIT)
+
 
 class TagViewSet(ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
@@ -44,22 +84,146 @@ class RecipeViewSet(ModelViewSet):
     permission_classes = (IsAdminOrReadOnly | IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = LimitPageNumberPagination
+    pagination_class = OptionalCursorPagination
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            'recipe_ingredient__ingredient',
+        )
+        user = self.request.user
+
+        if user.is_anonymous:
+            return queryset
+
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favourite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            author_is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=user,
+                    author=OuterRef('author')
+                )
+            ),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            get_recipe_list_namespaces(request.query_params),
+            self._list,
+            *args,
+            **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            [f'recipe:{kwargs["pk"]}', 'tags', 'ingredients'],
+            self._retrieve,
+            *args,
+            **kwargs
+        )
+
+    # Чтение рецептов собирает ответ из строк values() функциями
+    # api.representations, минуя ExtendedRecipeSerializer.
+    def _list(self, request, *args, **kwargs):
+        rows = get_recipe_rows(
+            self.filter_queryset(self.get_queryset()),
+            request.user
+        )
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(represent_recipes(rows, request, 'card'))
+
+        return self.get_paginated_response(
+            represent_recipes(page, request, 'card')
+        )
+
+    def _retrieve(self, request, *args, **kwargs):
+        row = get_object_or_404(
+            get_recipe_rows(
+                self.filter_queryset(self.get_queryset()),
+                request.user
+            ),
+            pk=kwargs['pk']
+        )
+        self.check_object_permissions(request, row)
+
+        return Response(represent_recipes([row], request)[0])
+
+    def _cached_response(self, namespaces, handler, *args, **kwargs):
+        # Ответ зависит от пользователя только через аннотации,
+        # которые анонимному пользователю не добавляются.
+        cacheable = (
+            self.request.user.is_anonymous
+            and recipe_response_cache.enabled
+            and namespaces is not None
+        )
+        if not cacheable:
+            return handler(self.request, *args, **kwargs)
+
+        key = recipe_response_cache.get_key(self.request)
+        data = recipe_response_cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        versions = recipe_response_cache.get_versions(namespaces)
+        response = handler(self.request, *args, **kwargs)
+        if response.status_code == HTTPStatus.OK:
+            recipe_response_cache.set(
+                key,
+                response.data,
+                {
+                    **recipe_response_cache.get_versions(
+                        get_recipe_data_namespaces(response.data)
+                    ),
+                    **versions,
+                }
+            )
+
+        return response
+
+    def perform_content_negotiation(self, request, force=False):
+        # Параметр format у download_shopping_cart выбирает формат файла,
+        # а не рендерер DRF.
+        force = force or self.action == 'download_shopping_cart'
+        return super().perform_content_negotiation(request, force)
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return ExtendedRecipeSerializer
         return RecipeCreateSerializer
 
-    def _add_to(self, target_related_manager: models.Manager):
-        recipe = self.get_object()
+    def _add_to(self, model: type[models.Model]):
+        user = self.request.user
+        pk = self.kwargs['pk']
 
         if self.request.method == 'POST':
+            recipe = get_object_or_404(
+                Recipe.objects.only(*RECIPE_MINIFIED_FIELDS).annotate(
+                    is_added=Exists(
+                        model.objects.filter(user=user, recipe=OuterRef('pk'))
+                    )
+                ),
+                pk=pk
+            )
+            if recipe.is_added:
+                content = {'errors': 'Error adding recipe.'}
+                return Response(content, status=HTTPStatus.BAD_REQUEST)
+
             try:
-                target_related_manager.create(recipe=recipe)
-            except Exception:
+                with transaction.atomic():
+                    model.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
                 content = {'errors': 'Error adding recipe.'}
                 return Response(content, status=HTTPStatus.BAD_REQUEST)
+
             serializer = RecipeSerializer(
                 instance=recipe,
                 context={'request': self.request}
@@ -69,13 +233,55 @@ class RecipeViewSet(ModelViewSet):
                 serializer.data,
                 status=HTTPStatus.CREATED,
             )
-        if self.request.method == 'DELETE':
-            target_related_manager.get(recipe_id=recipe.id).delete()
+
+        deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+        if deleted:
             return Response(
                 status=HTTPStatus.NO_CONTENT
             )
 
-        return Response(HTTPStatus.BAD_REQUEST)
+        get_object_or_404(Recipe, pk=pk)
+        content = {'errors': 'Рецепт не был добавлен.'}
+        return Response(content, status=HTTPStatus.BAD_REQUEST)
+
+    def _add_many_to(self, model: type[models.Model], counter: str):
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['ids']
+        ids = [recipe.pk for recipe in recipes]
+        user = self.request.user
+
+        # Массовые операции выполняются одним запросом без сигналов,
+        # поэтому счетчики пересчитываются, а кэш PDF сбрасывается
+        # здесь же, один раз на весь список.
+        with transaction.atomic():
+            if self.request.method == 'POST':
+                model.objects.bulk_create(
+                    (model(user=user, recipe=recipe) for recipe in recipes),
+                    ignore_conflicts=True
+                )
+            else:
+                # На избранное и списки покупок никто не ссылается,
+                # каскадное удаление не требуется.
+                queryset = model.objects.filter(user=user, recipe__in=ids)
+                queryset._raw_delete(queryset.db)
+            refresh_counter(Recipe, ids, counter)
+
+        if model is ShoppingCart:
+            transaction.on_commit(
+                lambda: shopping_list_pdf_cache.invalidate_user(user.id)
+            )
+
+        if self.request.method == 'DELETE':
+            return Response(status=HTTPStatus.NO_CONTENT)
+
+        serializer = RecipeSerializer(
+            recipes,
+            many=True,
+            context={'request': self.request}
+        )
+
+        return Response(serializer.data, status=HTTPStatus.CREATED)
 
     @action(
         detail=True,
@@ -83,9 +289,7 @@ class RecipeViewSet(ModelViewSet):
         methods=('POST', 'DELETE',)
     )
     def favorite(self, request, pk):
-        return self._add_to(
-            self.request.user.favorite
-        )
+        return self._add_to(Favourite)
 
     @action(
         detail=True,
@@ -93,19 +297,116 @@ class RecipeViewSet(ModelViewSet):
         methods=('POST', 'DELETE'),
     )
     def shopping_cart(self, request, pk):
-        return self._add_to(
-            self.request.user.shopping_user
-        )
+        return self._add_to(ShoppingCart)
 
-    @action(detail=False)
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        methods=('POST', 'DELETE'),
+        url_path='favorite',
+        url_name='favorite-many'
+    )
+    def favorite_many(self, request):
+        return self._add_many_to(Favourite, 'favorites_count')
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        methods=('POST', 'DELETE'),
+        url_path='shopping_cart',
+        url_name='shopping-cart-many'
+    )
+    def shopping_cart_many(self, request):
+        return self._add_many_to(ShoppingCart, 'shopping_cart_count')
+
+    @action(detail=False, permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
-        ingredients = get_shopping_list(self.request.user)
-        html_template = render_to_string(
-            'recipes/shopping_list.html',
-            {'ingredients': ingredients}
+        shopping_list_format = request.query_params.get('format', 'pdf')
+
+        if shopping_list_format in SHOPPING_LIST_STREAMS:
+            return shopping_list_stream_response(
+                get_shopping_list(self.request.user).iterator(),
+                shopping_list_format
+            )
+
+        if shopping_list_format != 'pdf':
+            content = {'errors': 'Неподдерживаемый формат списка покупок.'}
+            return Response(content, status=HTTPStatus.BAD_REQUEST)
+
+        ingredients = list(get_shopping_list(self.request.user))
+        key = get_shopping_list_digest(ingredients)
+
+        if request.query_params.get('async') in ('1', 'true'):
+            return self._enqueue_shopping_list(key, ingredients)
+
+        pdf_file = shopping_list_pdf_cache.get_or_create(
+            key,
+            self.request.user.id,
+            lambda: render_shopping_list_pdf(ingredients)
         )
 
-        return render_pdf_response(html_template)
+        return pdf_response(pdf_file)
+
+    def _enqueue_shopping_list(self, key: str, ingredients: list):
+        if shopping_list_pdf_cache.get(key, self.request.user.id) is None:
+            html = render_shopping_list_html(ingredients)
+            if not shopping_list_renderer.submit(key, html):
+                content = {'errors': 'Очередь рендеринга переполнена.'}
+                return Response(
+                    content,
+                    status=HTTPStatus.SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '5'}
+                )
+
+        url = reverse(
+            'api:recipes-shopping-cart-job',
+            kwargs={'job_id': key},
+            request=self.request
+        )
+
+        return Response(
+            {'id': key, 'url': url},
+            status=HTTPStatus.ACCEPTED,
+            headers={'Location': url}
+        )
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})',
+        url_name='shopping-cart-job',
+    )
+    def shopping_cart_job(self, request, job_id):
+        status = shopping_list_renderer.status(job_id)
+
+        if status == shopping_list_renderer.DONE:
+            pdf_file = shopping_list_renderer.get_pdf(job_id)
+            if pdf_file is not None:
+                return pdf_response(pdf_file)
+            status = shopping_list_renderer.EXPIRED
+
+        if status == shopping_list_renderer.PENDING:
+            return Response(
+                {'id': job_id, 'status': status},
+                status=HTTPStatus.ACCEPTED
+            )
+
+        if status == shopping_list_renderer.FAILED:
+            content = {'errors': 'Ошибка при формировании списка покупок.'}
+            return Response(
+                content,
+                status=HTTPStatus.INTERNAL_SERVER_ERROR
+            )
+
+        if status == shopping_list_renderer.EXPIRED:
+            content = {
+                'errors': 'Файл списка покупок больше не хранится, '
+                          'запросите его заново.'
+            }
+            return Response(content, status=HTTPStatus.GONE)
+
+        content = {'errors': 'Задача не найдена.'}
+        return Response(content, status=HTTPStatus.NOT_FOUND)
 
 
 @api_view(['POST', 'DELETE'])
@@ -128,7 +429,10 @@ def subscribe(request, pk):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        subscriptions = User.objects.all().filter(id=author.id)
+        subscriptions = annotate_subscriptions(
+            User.objects.filter(id=author.id),
+            request
+        )
         serializer = SubscriptionSerializer(
             subscriptions,
             many=True,
@@ -162,7 +466,29 @@ class SubscriptionListViewSet(ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return User.objects.filter(subscribed_to__user=user)
+        return annotate_subscriptions(
+            User.objects.filter(subscribed_to__user=user).order_by('id'),
+            self.request
+        )
+
+
+class CustomUserViewSet(UserViewSet):
+    pagination_class = OptionalUserCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by(
+            UserCursorPagination.ordering
+        )
+        user = self.request.user
+
+        if user.is_anonymous:
+            return queryset
+
+        return queryset.annotate(
+            is_subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            )
+        )
 
 
 class CustomTokenDestroyView(TokenDestroyView):
@@ -0,0 +1,31 @@
+import os
+
+RESPONSE_CACHE_ALIAS = 'responses'
+
+RESPONSE_CACHE_BACKEND = os.environ.get(
+    'RESPONSE_CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache'
+)
+
+RESPONSE_CACHE_LOCATION = os.environ.get('RESPONSE_CACHE_LOCATION', '')
+
+# Время жизни ответа в секундах, 0 отключает кэш.
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    RESPONSE_CACHE_ALIAS: {
+        'BACKEND': RESPONSE_CACHE_BACKEND,
+        'LOCATION': RESPONSE_CACHE_LOCATION,
+        'KEY_PREFIX': 'foodgram',
+    },
+}
+
+if RESPONSE_CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES[RESPONSE_CACHE_ALIAS]['OPTIONS'] = {
+        'MAX_ENTRIES': int(
+            os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 10000)
+        ),
+    }
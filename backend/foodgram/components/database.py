@@ -7,7 +7,10 @@ DATABASES = {
         'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
         'PORT': os.environ.get('POSTGRES_PORT', 5432),
         'OPTIONS': {
-            'options': '-c search_path=public,content'
+            'options': (
+                '-c search_path=public,content '
+                '-c pg_trgm.word_similarity_threshold=0.5'
+            )
         }
     }
 }
\ No newline at end of file
@@ -0,0 +1,13 @@
+import os
+
+SHOPPING_LIST_PDF_CACHE_SIZE = int(
+    os.environ.get('SHOPPING_LIST_PDF_CACHE_SIZE', 32 * 1024 * 1024)
+)
+
+SHOPPING_LIST_RENDER_WORKERS = int(
+    os.environ.get('SHOPPING_LIST_RENDER_WORKERS', 2)
+)
+
+SHOPPING_LIST_RENDER_QUEUE_SIZE = int(
+    os.environ.get('SHOPPING_LIST_RENDER_QUEUE_SIZE', 32)
+)
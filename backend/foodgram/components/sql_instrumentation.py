@@ -0,0 +1,17 @@
+import os
+
+SQL_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.environ.get('SQL_INSTRUMENTATION_SAMPLE_RATE', 0)
+)
+
+SQL_INSTRUMENTATION_SERVER_TIMING = (
+    os.environ.get('SQL_INSTRUMENTATION_SERVER_TIMING', False) == 'True'
+)
+
+SQL_INSTRUMENTATION_SLOW_QUERIES = int(
+    os.environ.get('SQL_INSTRUMENTATION_SLOW_QUERIES', 3)
+)
+
+SQL_INSTRUMENTATION_REPEAT_THRESHOLD = int(
+    os.environ.get('SQL_INSTRUMENTATION_REPEAT_THRESHOLD', 5)
+)
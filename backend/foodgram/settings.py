@@ -60,5 +60,20 @@ include(
     'components/djoser.py'
 )
 
+# Shopping list
+include(
+    'components/shopping_list.py'
+)
+
+# SQL instrumentation
+include(
+    'components/sql_instrumentation.py'
+)
+
+# Cache
+include(
+    'components/cache.py'
+)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -12,7 +12,9 @@ class IngredientRecipeInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'text', 'image', 'cooking_time')
+    list_display = (
+        'id', 'name', 'text', 'image', 'cooking_time', 'favorites_count'
+    )
     search_fields = ('name', 'text')
     inlines = (IngredientRecipeInline, )
 
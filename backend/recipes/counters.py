@@ -0,0 +1,153 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+from users.models import Subscription
+
+from .models import Favourite, Recipe, ShoppingCart
+
+User = get_user_model()
+
+# Маска хранится в знаковом BigIntegerField, старший бит не используется.
+MAX_TAG_BITS = 63
+
+
+def get_counters() -> tuple:
+    """
+    Описание денормализованных счетчиков: модель, поле счетчика,
+    модель связи и поле связи, указывающее на объект модели.
+    """
+    return (
+        (Recipe, 'favorites_count', Favourite, 'recipe'),
+        (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', Subscription, 'author'),
+    )
+
+
+def count_subquery(related_model, related_field: str) -> Coalesce:
+    counts = related_model.objects.order_by().filter(
+        **{related_field: OuterRef('pk')}
+    ).values(related_field).annotate(
+        total=Count('pk')
+    ).values('total')
+
+    return Coalesce(
+        Subquery(counts, output_field=IntegerField()),
+        Value(0)
+    )
+
+
+def has_any_tag(tag_ids) -> GreaterThan | None:
+    """
+    Условие «у рецепта есть хотя бы один из тегов» по Recipe.tags_mask.
+
+    Возвращает None, если какой-то из тегов не помещается в маску.
+    """
+    tag_ids = tuple(tag_ids)
+    if any(tag_bit(tag_id) is None for tag_id in tag_ids):
+        return None
+
+    return GreaterThan(F('tags_mask').bitand(mask_of_tags(tag_ids)), 0)
+
+
+def update_tags_mask(recipe_ids, tag_ids, add: bool):
+    """Устанавливает или снимает биты тегов в масках рецептов."""
+    mask = mask_of_tags(tag_ids)
+    if not mask:
+        return
+
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        tags_mask=(
+            F('tags_mask').bitor(mask) if add
+            else F('tags_mask').bitand(~mask)
+        )
+    )
+
+
+def increment(model, pk: int, field: str, delta: int = 1):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def refresh(model, pks, field: str):
+    """
+    Пересчитывает счетчик для объектов pks одним запросом.
+
+    Используется после массовых операций, не отправляющих сигналы.
+    """
+    for counter_model, counter_field, related_model, related_field in (
+        get_counters()
+    ):
+        if counter_model is model and counter_field == field:
+            model.objects.filter(pk__in=pks).update(
+                **{field: count_subquery(related_model, related_field)}
+            )
+            return
+
+    raise ValueError(f'Unknown counter {model.__name__}.{field}')
+
+
+def tag_bit(tag_id: int) -> int | None:
+    """Бит тега в Recipe.tags_mask или None, если тег не помещается."""
+    if 0 < tag_id <= MAX_TAG_BITS:
+        return 1 << (tag_id - 1)
+
+    return None
+
+
+def mask_of_tags(tag_ids) -> int:
+    mask = 0
+    for tag_id in tag_ids:
+        mask |= tag_bit(tag_id) or 0
+
+    return mask
+
+
+def _tag_mask_mismatches() -> list:
+    masks = defaultdict(int)
+    for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+        'recipe_id', 'tag_id'
+    ).iterator():
+        masks[recipe_id] |= tag_bit(tag_id) or 0
+
+    mismatches = []
+    for recipe in Recipe.objects.only('id', 'tags_mask').iterator():
+        mask = masks.get(recipe.id, 0)
+        if recipe.tags_mask != mask:
+            recipe.tags_mask = mask
+            mismatches.append(recipe)
+
+    return mismatches
+
+
+def rebuild_counters() -> dict:
+    """Пересчитывает все счетчики, возвращает число исправленных строк."""
+    fixed = {
+        'Recipe.tags_mask': Recipe.objects.bulk_update(
+            _tag_mask_mismatches(), ['tags_mask'], batch_size=1000
+        )
+    }
+    for model, field, related_model, related_field in get_counters():
+        actual = count_subquery(related_model, related_field)
+        fixed[f'{model.__name__}.{field}'] = model.objects.annotate(
+            actual=actual
+        ).exclude(
+            **{field: F('actual')}
+        ).update(**{field: actual})
+
+    return fixed
+
+
+def verify_counters() -> dict:
+    """Возвращает число строк с расхождением для каждого счетчика."""
+    mismatches = {
+        f'{model.__name__}.{field}': model.objects.annotate(
+            actual=count_subquery(related_model, related_field)
+        ).exclude(**{field: F('actual')}).count()
+        for model, field, related_model, related_field in get_counters()
+    }
+    mismatches['Recipe.tags_mask'] = len(_tag_mask_mismatches())
+
+    return mismatches
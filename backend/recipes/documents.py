@@ -0,0 +1,153 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q
+
+from .images import RENDITIONS
+from .models import Recipe, RecipeDocument, RecipeIngredient
+
+# Поля рецепта, из которых собирается документ.
+RECIPE_DOCUMENT_FIELDS = (
+    'id',
+    'document_version',
+    'name',
+    'text',
+    'cooking_time',
+    'image',
+    'image_renditions',
+    'author_id',
+    'author__email',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+)
+
+
+def build_documents(recipe_ids) -> dict:
+    """
+    Собирает документы рецептов тремя запросами.
+
+    Автор, теги и ингредиенты хранятся списками значений, а не
+    словарями: jsonb в PostgreSQL не сохраняет порядок ключей.
+    Ссылки на изображения относительные, адрес сайта добавляется
+    при ответе. Версия рецепта читается раньше тегов и ингредиентов,
+    поэтому документ, собранный во время изменения рецепта, получает
+    прежнюю версию и будет пересобран.
+    """
+    recipe_ids = list(recipe_ids)
+    recipes = list(
+        Recipe.objects.filter(pk__in=recipe_ids).values(
+            *RECIPE_DOCUMENT_FIELDS
+        )
+    )
+
+    tags = defaultdict(list)
+    for recipe_id, *tag in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    ):
+        tags[recipe_id].append(tag)
+
+    ingredients = defaultdict(list)
+    for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('pk').values_list(
+        'recipe_id',
+        'ingredient_id',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount'
+    ):
+        ingredients[recipe_id].append(ingredient)
+
+    storage = Recipe.image.field.storage
+    documents = {}
+    for row in recipes:
+        documents[row['id']] = RecipeDocument(
+            recipe_id=row['id'],
+            version=row['document_version'],
+            document={
+                'name': row['name'],
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'author': None if row['author_id'] is None else [
+                    row['author__email'],
+                    row['author_id'],
+                    row['author__username'],
+                    row['author__first_name'],
+                    row['author__last_name'],
+                ],
+                'image': _image_urls(row, storage),
+                'tags': tags[row['id']],
+                'ingredients': ingredients[row['id']],
+            }
+        )
+
+    return documents
+
+
+def refresh_documents(recipe_ids) -> dict:
+    """Пересобирает и перезаписывает документы рецептов."""
+    documents = build_documents(recipe_ids)
+
+    RecipeDocument.objects.bulk_create(
+        documents.values(),
+        update_conflicts=True,
+        unique_fields=('recipe',),
+        update_fields=('document', 'version')
+    )
+
+    return {pk: document.document for pk, document in documents.items()}
+
+
+def ensure_documents(recipe_ids, outdated_ids=()) -> dict:
+    """
+    Собирает недостающие и устаревшие документы при чтении.
+
+    outdated_ids — рецепты, у которых есть документ прежней версии.
+    В отличие от refresh_documents, документ, собранный по более
+    новой версии рецепта другим запросом, не заменяется.
+    """
+    documents = build_documents(recipe_ids)
+
+    outdated = [
+        Q(recipe_id=pk, version__lt=documents[pk].version)
+        for pk in outdated_ids if pk in documents
+    ]
+    if outdated:
+        RecipeDocument.objects.filter(reduce(or_, outdated)).delete()
+    RecipeDocument.objects.bulk_create(
+        documents.values(), ignore_conflicts=True
+    )
+
+    return {pk: document.document for pk, document in documents.items()}
+
+
+def invalidate_documents(**lookups):
+    """
+    Отмечает устаревшими документы рецептов, подходящих под условия.
+
+    Версия рецепта увеличивается в текущей транзакции, документ
+    пересобирается при следующем чтении. Обработчики сигналов
+    вызывают функцию сами; массовые операции, не отправляющие
+    сигналов (update(), bulk_create(), bulk_update()), должны
+    вызывать ее явно.
+    """
+    Recipe.objects.filter(**lookups).update(
+        document_version=F('document_version') + 1
+    )
+
+
+def _image_urls(row, storage) -> dict | None:
+    if not row['image']:
+        return None
+
+    renditions = row['image_renditions'] or {}
+    urls = {'original': storage.url(row['image'])}
+    for rendition in RENDITIONS:
+        if rendition in renditions:
+            urls[rendition] = storage.url(renditions[rendition])
+
+    return urls
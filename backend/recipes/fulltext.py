@@ -0,0 +1,220 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'pg_catalog.russian'
+
+# Вес совпадений в названии относительно описания (bm25 в SQLite).
+NAME_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+
+WORD = re.compile(r'\w+')
+
+
+def split_table_name(db_table: str) -> tuple[str | None, str]:
+    """Разделяет имя таблицы вида 'схема"."таблица' на схему и таблицу."""
+    if '"."' in db_table:
+        schema, table = db_table.split('"."', 1)
+        return schema, table
+
+    return None, db_table
+
+
+def _qualified(schema_editor, schema: str | None, name: str) -> str:
+    name = schema_editor.quote_name(name)
+    if schema is None:
+        return name
+
+    return f'{schema_editor.quote_name(schema)}.{name}'
+
+
+def install(schema_editor, model):
+    """
+    Создает поисковый индекс по названию и описанию рецептов.
+
+    В PostgreSQL столбец search_vector заполняется триггером и
+    индексируется GIN, в SQLite создается таблица FTS5 с внешним
+    содержимым, синхронизируемая триггерами.
+    """
+    vendor = schema_editor.connection.vendor
+    schema, table = split_table_name(model._meta.db_table)
+
+    if vendor == 'postgresql':
+        _install_postgresql(schema_editor, schema, table)
+    elif vendor == 'sqlite':
+        _install_sqlite(schema_editor, schema, table)
+
+
+def restore(schema_editor, model):
+    """
+    Восстанавливает поисковый индекс после пересоздания таблицы.
+
+    SQLite изменяет столбцы, пересоздавая таблицу, и ее триггеры при
+    этом удаляются, поэтому миграции, меняющие столбцы рецептов,
+    вызывают restore после изменения. В PostgreSQL таблица изменяется
+    на месте, и восстанавливать ничего не нужно.
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        _install_sqlite(
+            schema_editor, *split_table_name(model._meta.db_table)
+        )
+
+
+def uninstall(schema_editor, model):
+    vendor = schema_editor.connection.vendor
+    schema, table = split_table_name(model._meta.db_table)
+
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP TRIGGER IF EXISTS '
+            f'{schema_editor.quote_name(table + "_search_vector_update")} '
+            f'ON {_qualified(schema_editor, schema, table)}'
+        )
+        schema_editor.execute(
+            'DROP FUNCTION IF EXISTS '
+            f'{_qualified(schema_editor, schema, table + "_search_vector")}()'
+        )
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS '
+            f'{_qualified(schema_editor, schema, table + "_search_idx")}'
+        )
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(
+                'DROP TRIGGER IF EXISTS '
+                f'{_qualified(schema_editor, schema, f"{table}_fts_{suffix}")}'
+            )
+        schema_editor.execute(
+            'DROP TABLE IF EXISTS '
+            f'{_qualified(schema_editor, schema, table + "_fts")}'
+        )
+
+
+def _install_postgresql(schema_editor, schema, table):
+    qualified_table = _qualified(schema_editor, schema, table)
+    function = _qualified(schema_editor, schema, f'{table}_search_vector')
+    vector = (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        "coalesce({row}name, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        "coalesce({row}text, '')), 'B')"
+    )
+
+    schema_editor.execute(
+        f'CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$ '
+        f'BEGIN NEW.search_vector := {vector.format(row="NEW.")}; '
+        'RETURN NEW; END $$ LANGUAGE plpgsql'
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER '
+        f'{schema_editor.quote_name(table + "_search_vector_update")} '
+        f'BEFORE INSERT OR UPDATE OF name, text ON {qualified_table} '
+        f'FOR EACH ROW EXECUTE FUNCTION {function}()'
+    )
+    schema_editor.execute(
+        f'UPDATE {qualified_table} SET search_vector = {vector.format(row="")}'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS '
+        f'{schema_editor.quote_name(table + "_search_idx")} '
+        f'ON {qualified_table} USING gin (search_vector)'
+    )
+
+
+def _install_sqlite(schema_editor, schema, table):
+    fts = _qualified(schema_editor, schema, f'{table}_fts')
+    fts_table = schema_editor.quote_name(f'{table}_fts')
+    source = schema_editor.quote_name(table)
+
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+        f"name, text, content='{table}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER IF NOT EXISTS '
+        f'{_qualified(schema_editor, schema, f"{table}_fts_ai")} '
+        f'AFTER INSERT ON {source} BEGIN '
+        f'INSERT INTO {fts_table}(rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER IF NOT EXISTS '
+        f'{_qualified(schema_editor, schema, f"{table}_fts_ad")} '
+        f'AFTER DELETE ON {source} BEGIN '
+        f"INSERT INTO {fts_table}({fts_table}, rowid, name, text) "
+        "VALUES ('delete', old.id, old.name, old.text); END"
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER IF NOT EXISTS '
+        f'{_qualified(schema_editor, schema, f"{table}_fts_au")} '
+        f'AFTER UPDATE OF name, text ON {source} BEGIN '
+        f"INSERT INTO {fts_table}({fts_table}, rowid, name, text) "
+        "VALUES ('delete', old.id, old.name, old.text); "
+        f'INSERT INTO {fts_table}(rowid, name, text) '
+        'VALUES (new.id, new.name, new.text); END'
+    )
+    schema_editor.execute(
+        f"INSERT INTO {fts}({fts_table}) VALUES ('rebuild')"
+    )
+
+
+def fts5_query(value: str) -> str | None:
+    """
+    Преобразует пользовательский запрос в запрос FTS5.
+
+    Каждое слово ищется как префикс, что приближенно заменяет
+    стемминг PostgreSQL; операторы FTS5 из ввода не используются.
+    """
+    words = WORD.findall(value)
+    if not words:
+        return None
+
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(queryset: QuerySet, value: str) -> QuerySet:
+    """
+    Фильтрует рецепты по поисковому запросу и сортирует по релевантности.
+    """
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-id')
+
+    if connection.vendor == 'sqlite':
+        query = fts5_query(value)
+        if query is None:
+            return queryset.none()
+
+        quote_name = connection.ops.quote_name
+        db_table = queryset.model._meta.db_table
+        schema, table = split_table_name(db_table)
+        fts_table = quote_name(f'{table}_fts')
+        fts = fts_table if schema is None else (
+            f'{quote_name(schema)}.{fts_table}'
+        )
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {fts} WHERE {fts_table} MATCH %s',
+                (query,)
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({fts_table}, {NAME_WEIGHT}, {TEXT_WEIGHT}) '
+                f'FROM {fts} WHERE {fts_table} MATCH %s '
+                f'AND {fts_table}.rowid = {quote_name(db_table)}.id',
+                (query,),
+                output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-id')
+
+    return queryset.filter(Q(name__icontains=value) | Q(text__icontains=value))
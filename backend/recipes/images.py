@@ -0,0 +1,111 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+RENDITION_FORMAT = 'WEBP'
+RENDITION_QUALITY = 80
+
+RENDITIONS = {
+    'thumbnail': (240, 240),
+    'card': (640, 640),
+}
+
+
+def rendition_name(image_name: str, rendition: str) -> str:
+    """Возвращает путь копии изображения рядом с оригиналом."""
+    path = PurePosixPath(image_name)
+
+    return str(
+        path.with_name(f'{path.stem}.{rendition}.{RENDITION_FORMAT.lower()}')
+    )
+
+
+def is_up_to_date(image_name: str, renditions: dict) -> bool:
+    return all(
+        renditions.get(rendition) == rendition_name(image_name, rendition)
+        for rendition in RENDITIONS
+    )
+
+
+def render(image: Image.Image, size: tuple[int, int]) -> bytes:
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        RENDITION_FORMAT,
+        quality=RENDITION_QUALITY,
+        method=4
+    )
+
+    return buffer.getvalue()
+
+
+def create_renditions(image: FieldFile) -> dict:
+    """
+    Создает уменьшенные копии изображения в формате WebP.
+
+    Оригинал декодируется один раз: для JPEG сразу в размере,
+    достаточном для самой крупной копии.
+    """
+    largest = max(RENDITIONS.values())
+
+    with image.open('rb') as file, Image.open(file) as original:
+        original.draft('RGB', largest)
+        source = ImageOps.exif_transpose(original)
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert(
+                'RGBA' if 'transparency' in source.info else 'RGB'
+            )
+
+        renditions = {}
+        for rendition, size in RENDITIONS.items():
+            name = rendition_name(image.name, rendition)
+            if image.storage.exists(name):
+                image.storage.delete(name)
+            renditions[rendition] = image.storage.save(
+                name, ContentFile(render(source, size))
+            )
+
+    return renditions
+
+
+def stored_renditions(image: FieldFile) -> dict | None:
+    """Возвращает копии, если все они уже есть в хранилище."""
+    renditions = {
+        rendition: rendition_name(image.name, rendition)
+        for rendition in RENDITIONS
+    }
+    if all(image.storage.exists(name) for name in renditions.values()):
+        return renditions
+
+    return None
+
+
+def update_renditions(recipe, force: bool = False) -> bool:
+    """
+    Создает недостающие копии изображения рецепта.
+
+    Возвращает True, если копии были созданы.
+    """
+    if not recipe.image:
+        return False
+    if not force and is_up_to_date(recipe.image.name,
+                                   recipe.image_renditions):
+        return False
+
+    # Копии уже загруженного ранее файла не нужно создавать заново.
+    renditions = None if force else stored_renditions(recipe.image)
+    recipe.image_renditions = renditions or create_renditions(recipe.image)
+    # Ссылки на копии входят в документ рецепта, см. recipes.documents.
+    type(recipe).objects.filter(pk=recipe.pk).update(
+        image_renditions=recipe.image_renditions,
+        document_version=F('document_version') + 1
+    )
+
+    return True
@@ -0,0 +1,421 @@
+import base64
+import io
+import json
+import math
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+BUDGETS_PATH = (
+    Path(__file__).resolve().parents[2] / 'data' / 'benchmark_budgets.json'
+)
+
+# Запас, с которым --write_budgets сохраняет измеренные значения.
+TIME_HEADROOM = 3
+ALLOCATION_HEADROOM = 1.5
+
+# Пиковые аллокации берутся как минимум из нескольких прогонов,
+# чтобы не учитывать разовое заполнение внутренних кэшей.
+ALLOCATION_RUNS = 3
+
+# Время ответа зависит от машины, поэтому по умолчанию его превышение
+# только выводится; команда падает при превышении остальных бюджетов.
+TIME_METRICS = ('p95_ms',)
+
+PASSWORD = 'tomato-soup-42'
+
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    path: str | Callable[[], str]
+    data: dict | None = None
+    prepare: Callable[[], Any] | None = None
+    client: APIClient | None = None
+
+
+def percentile(values: list, percent: float) -> float:
+    ordered = sorted(values)
+    index = max(math.ceil(len(ordered) * percent / 100) - 1, 0)
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет эндпоинты API через тестовый клиент на текущей БД '
+        'и сравнивает число запросов, время и память с бюджетами.'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '-n',
+            '--iterations',
+            type=int,
+            default=20,
+            help='Количество замеров на эндпоинт'
+        )
+        parser.add_argument(
+            '--budgets',
+            default=str(BUDGETS_PATH),
+            help='Путь к файлу бюджетов'
+        )
+        parser.add_argument(
+            '--write_budgets',
+            action='store_true',
+            help='Сохранить измеренные значения как новые бюджеты'
+        )
+        parser.add_argument(
+            '-k',
+            '--filter',
+            default='',
+            help='Запускать только сценарии, содержащие подстроку'
+        )
+        parser.add_argument(
+            '--strict_time',
+            action='store_true',
+            help='Считать превышение бюджета времени ошибкой'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        if not Recipe.objects.exists() or not Tag.objects.exists():
+            raise CommandError(
+                'No recipes found, run load_db and generate_dataset first'
+            )
+
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            results = self._run(options['iterations'], options['filter'])
+            transaction.set_rollback(True)
+
+        budgets_path = Path(options['budgets'])
+        if options['write_budgets']:
+            self._write_budgets(budgets_path, results)
+            return
+
+        violations, warnings = self._check_budgets(
+            budgets_path, results, options['strict_time']
+        )
+        for warning in warnings:
+            self.stdout.write(self.style.WARNING(warning))
+        if violations:
+            raise CommandError(
+                'Budgets exceeded:\n' + '\n'.join(violations)
+            )
+
+        self.stdout.write(self.style.SUCCESS('All budgets met'))
+
+    def _run(self, iterations: int, name_filter: str) -> dict:
+        self.client = self._get_client()
+        results = {}
+
+        self.stdout.write(
+            f'{"scenario":<32}{"queries":>8}{"p50 ms":>10}'
+            f'{"p95 ms":>10}{"p99 ms":>10}{"alloc KiB":>11}'
+        )
+        for scenario in self._get_scenarios():
+            if name_filter not in scenario.name:
+                continue
+
+            result = self._measure(scenario, iterations)
+            results[scenario.name] = result
+            self.stdout.write(
+                f'{scenario.name:<32}{result["queries"]:>8}'
+                f'{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}'
+                f'{result["p99_ms"]:>10.1f}{result["alloc_kb"]:>11.0f}'
+            )
+
+        return results
+
+    def _get_client(self) -> APIClient:
+        self.user = User.objects.create_user(
+            username='benchmark',
+            email='benchmark@example.com',
+            password=PASSWORD,
+        )
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+
+        return client
+
+    def _request(self, scenario: Scenario):
+        path = scenario.path() if callable(scenario.path) else scenario.path
+        response = getattr(scenario.client or self.client, scenario.method)(
+            path,
+            scenario.data,
+            format='json'
+        )
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{scenario.name}: {scenario.method.upper()} {path} '
+                f'returned {response.status_code}'
+            )
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+        return response
+
+    def _measure(self, scenario: Scenario, iterations: int) -> dict:
+        timings = []
+        queries = 0
+
+        for _ in range(iterations):
+            if scenario.prepare:
+                scenario.prepare()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                self._request(scenario)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(context.captured_queries))
+
+        peaks = []
+        for _ in range(ALLOCATION_RUNS):
+            if scenario.prepare:
+                scenario.prepare()
+            tracemalloc.start()
+            try:
+                self._request(scenario)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+        peak = min(peaks)
+
+        return {
+            'queries': queries,
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'p99_ms': percentile(timings, 99),
+            'alloc_kb': peak / 1024,
+        }
+
+    def _get_scenarios(self) -> list:
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        author_id = recipe.author_id
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        ingredients = list(Ingredient.objects.values('id', 'name')[:10])
+        prefix = ingredients[0]['name'][:3]
+        word = quote(recipe.name.split()[0])
+        recipe_ids = list(
+            Recipe.objects.exclude(id=recipe.id).values_list('id', flat=True)[
+                :10
+            ]
+        )
+
+        recipe_data = {
+            'name': 'Бенчмарк',
+            'text': 'Рецепт для замеров производительности.',
+            'cooking_time': 10,
+            'image': self._get_image(),
+            'tags': tag_ids,
+            'ingredients': [
+                {'id': ingredient['id'], 'amount': 10}
+                for ingredient in ingredients
+            ],
+        }
+        own_recipe = self._request(
+            Scenario('setup', 'post', '/api/recipes/', recipe_data)
+        ).json()['id']
+
+        self.user.favorite.create(recipe=recipe)
+        self.user.shopping_user.create(recipe=recipe)
+        self.user.subscriber.create(author_id=author_id)
+
+        favorites = self.user.favorite.filter(recipe=recipe)
+        carts = self.user.shopping_user.filter(recipe_id=own_recipe)
+        subscriptions = self.user.subscriber.filter(author_id=author_id)
+        created = Recipe.objects.filter(author=self.user).exclude(
+            id=own_recipe
+        )
+        new_users = User.objects.filter(username='benchmark-new')
+        new_user_data = {
+            'email': 'benchmark-new@example.com',
+            'username': 'benchmark-new',
+            'first_name': 'Бенчмарк',
+            'last_name': 'Бенчмарк',
+            'password': PASSWORD,
+        }
+
+        anonymous_client = APIClient()
+        logout_client, restore_token = self._get_logout_client()
+
+        favorite = f'/api/recipes/{recipe.id}/favorite/'
+        cart = f'/api/recipes/{own_recipe}/shopping_cart/'
+        subscribe = f'/api/users/{author_id}/subscribe/'
+        download = '/api/recipes/download_shopping_cart/'
+        favorite_many = '/api/recipes/favorite/'
+        cart_many = '/api/recipes/shopping_cart/'
+
+        # Сценарии, которым нужен адрес, известный только после запроса.
+        urls = {}
+
+        def create_recipe():
+            urls['recipe'] = '/api/recipes/{}/'.format(self._request(
+                Scenario('setup', 'post', '/api/recipes/', recipe_data)
+            ).json()['id'])
+
+        def render_shopping_list():
+            self._request(Scenario('setup', 'get', download))
+            urls['job'] = self._request(
+                Scenario('setup', 'get', f'{download}?async=1')
+            ).json()['url']
+
+        def add_many(path):
+            return lambda: self._request(
+                Scenario('setup', 'post', path, {'ids': recipe_ids})
+            )
+
+        def remove_many(path):
+            return lambda: self._request(
+                Scenario('setup', 'delete', path, {'ids': recipe_ids})
+            )
+
+        return [
+            Scenario('recipes-list', 'get', '/api/recipes/'),
+            Scenario('recipes-list-page', 'get', '/api/recipes/?page=5'),
+            Scenario('recipes-list-cursor', 'get', '/api/recipes/?cursor='),
+            Scenario('recipes-filter-tags', 'get',
+                     f'/api/recipes/?tags={tags[0]}&tags={tags[-1]}'),
+            Scenario('recipes-filter-author', 'get',
+                     f'/api/recipes/?author={author_id}'),
+            Scenario('recipes-filter-favorited', 'get',
+                     '/api/recipes/?is_favorited=1'),
+            Scenario('recipes-filter-cart', 'get',
+                     '/api/recipes/?is_in_shopping_cart=1'),
+            Scenario('recipes-detail', 'get', f'/api/recipes/{recipe.id}/'),
+            Scenario('recipes-create', 'post', '/api/recipes/', recipe_data,
+                     prepare=created.delete),
+            Scenario('recipes-update', 'patch', f'/api/recipes/{own_recipe}/',
+                     recipe_data),
+            Scenario('recipes-delete', 'delete', lambda: urls['recipe'],
+                     prepare=create_recipe),
+            Scenario('recipes-search', 'get', f'/api/recipes/?search={word}'),
+            Scenario('favorite-add', 'post', favorite,
+                     prepare=favorites.delete),
+            Scenario('favorite-remove', 'delete', favorite,
+                     prepare=lambda: self.user.favorite.get_or_create(
+                         recipe=recipe
+                     )),
+            Scenario('shopping-cart-add', 'post', cart,
+                     prepare=carts.delete),
+            Scenario('shopping-cart-remove', 'delete', cart,
+                     prepare=lambda: self.user.shopping_user.get_or_create(
+                         recipe_id=own_recipe
+                     )),
+            Scenario('favorite-add-many', 'post', favorite_many,
+                     {'ids': recipe_ids}, prepare=remove_many(favorite_many)),
+            Scenario('favorite-remove-many', 'delete', favorite_many,
+                     {'ids': recipe_ids}, prepare=add_many(favorite_many)),
+            Scenario('shopping-cart-add-many', 'post', cart_many,
+                     {'ids': recipe_ids}, prepare=remove_many(cart_many)),
+            Scenario('shopping-cart-remove-many', 'delete', cart_many,
+                     {'ids': recipe_ids}, prepare=add_many(cart_many)),
+            Scenario('shopping-cart-pdf', 'get', download),
+            Scenario('shopping-cart-txt', 'get', f'{download}?format=txt'),
+            Scenario('shopping-cart-async', 'get', f'{download}?async=1'),
+            Scenario('shopping-cart-job', 'get', lambda: urls['job'],
+                     prepare=render_shopping_list),
+            Scenario('subscriptions-list', 'get',
+                     '/api/users/subscriptions/?recipes_limit=3'),
+            Scenario('subscribe-add', 'post', subscribe,
+                     prepare=subscriptions.delete),
+            Scenario('subscribe-remove', 'delete', subscribe,
+                     prepare=lambda: self.user.subscriber.get_or_create(
+                         author_id=author_id
+                     )),
+            Scenario('users-list', 'get', '/api/users/'),
+            Scenario('users-me', 'get', '/api/users/me/'),
+            Scenario('users-detail', 'get', f'/api/users/{author_id}/'),
+            Scenario('users-create', 'post', '/api/users/', new_user_data,
+                     prepare=new_users.delete, client=anonymous_client),
+            Scenario('users-set-password', 'post', '/api/users/set_password/',
+                     {'new_password': PASSWORD, 'current_password': PASSWORD}),
+            Scenario('token-login', 'post', '/api/auth/token/login/',
+                     {'email': self.user.email, 'password': PASSWORD},
+                     client=anonymous_client),
+            Scenario('token-logout', 'post', '/api/auth/token/logout/',
+                     prepare=restore_token, client=logout_client),
+            Scenario('ingredients-search', 'get',
+                     f'/api/ingredients/?name={prefix}'),
+            Scenario('ingredients-fuzzy-search', 'get',
+                     f'/api/ingredients/?name={prefix}&match=fuzzy'),
+            Scenario('ingredients-detail', 'get',
+                     f'/api/ingredients/{ingredients[0]["id"]}/'),
+            Scenario('tags-list', 'get', '/api/tags/'),
+            Scenario('tags-detail', 'get', f'/api/tags/{tag_ids[0]}/'),
+        ]
+
+    @staticmethod
+    def _get_logout_client() -> tuple:
+        """Клиент отдельного пользователя, чей токен удаляет logout."""
+        user = User.objects.create_user(
+            username='benchmark-logout',
+            email='benchmark-logout@example.com',
+            password=PASSWORD,
+        )
+        key = Token.generate_key()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+        return client, lambda: Token.objects.get_or_create(
+            user=user, defaults={'key': key}
+        )
+
+    @staticmethod
+    def _get_image() -> str:
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), '#4fc4bd').save(buffer, 'PNG')
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+
+        return f'data:image/png;base64,{encoded}'
+
+    def _write_budgets(self, path: Path, results: dict):
+        budgets = {
+            name: {
+                'queries': result['queries'],
+                'p95_ms': math.ceil(result['p95_ms'] * TIME_HEADROOM),
+                'alloc_kb': math.ceil(
+                    result['alloc_kb'] * ALLOCATION_HEADROOM
+                ),
+            }
+            for name, result in results.items()
+        }
+        path.write_text(
+            json.dumps(budgets, indent=4, ensure_ascii=False) + '\n',
+            encoding='utf-8'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Budgets written to {path}'))
+
+    def _check_budgets(self, path: Path, results: dict,
+                       strict_time: bool) -> tuple:
+        if not path.exists():
+            raise CommandError(f'Budget file {path} not found')
+
+        budgets = json.loads(path.read_text(encoding='utf-8'))
+        violations = []
+        warnings = []
+        for name, result in results.items():
+            for metric, limit in budgets.get(name, {}).items():
+                if result[metric] <= limit:
+                    continue
+
+                message = f'{name}: {metric} {result[metric]:.1f} > {limit}'
+                if metric in TIME_METRICS and not strict_time:
+                    warnings.append(message)
+                else:
+                    violations.append(message)
+
+        return violations, warnings
@@ -0,0 +1,76 @@
+from datetime import timedelta
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import Recipe
+
+# Файлы моложе этого срока могут принадлежать еще не
+# завершенной транзакции, поэтому не удаляются.
+GRACE_PERIOD = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из хранилища изображения рецептов, на которые '
+        'не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '-g',
+            '--grace_period',
+            type=int,
+            default=GRACE_PERIOD,
+            help='Не удалять файлы моложе заданного числа минут'
+        )
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            help='Только вывести список файлов, не удаляя их'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        field = Recipe.image.field
+        storage = field.storage
+        threshold = timezone.now() - timedelta(
+            minutes=options['grace_period']
+        )
+
+        referenced = set()
+        for image, renditions in Recipe.objects.values_list(
+            'image', 'image_renditions'
+        ).iterator():
+            referenced.add(image)
+            referenced.update((renditions or {}).values())
+
+        removed = size = 0
+        for name in self._walk(storage, field.upload_to.rstrip('/')):
+            if name in referenced:
+                continue
+            if storage.get_modified_time(name) > threshold:
+                continue
+
+            size += storage.size(name)
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{"Found" if options["dry_run"] else "Removed"} '
+                f'{removed} unreferenced files, {size / 1024:.0f} KiB'
+            )
+        )
+
+    def _walk(self, storage, path: str):
+        if not storage.exists(path):
+            return
+
+        directories, files = storage.listdir(path)
+        for name in files:
+            yield f'{path}/{name}'
+        for directory in directories:
+            yield from self._walk(storage, f'{path}/{directory}')
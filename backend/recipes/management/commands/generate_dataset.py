@@ -0,0 +1,264 @@
+import io
+import random
+import time
+from itertools import accumulate
+from typing import Any
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+from PIL import Image
+from recipes.counters import rebuild_counters
+from recipes.documents import refresh_documents
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+# Объемы данных при scale=1.
+USERS = 1000
+RECIPES = 10000
+FAVOURITES = 50000
+SHOPPING_CARTS = 20000
+SUBSCRIPTIONS = 20000
+
+INGREDIENTS_PER_RECIPE = (3, 12)
+TAGS_PER_RECIPE = (1, 3)
+
+# Показатель степенного распределения популярности.
+ZIPF_EXPONENT = 1.1
+
+IMAGE_NAME = 'recipes/synthetic.png'
+PASSWORD = 'synthetic-password'
+
+
+def zipf_weights(size: int, exponent: float = ZIPF_EXPONENT) -> list:
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетический набор данных для нагрузочного '
+        'тестирования на основе загруженных ингредиентов и тегов.'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '-s',
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел'
+        )
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Множитель объема данных'
+        )
+        parser.add_argument(
+            '-b',
+            '--batch_size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество строк в одной вставке'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        self.rng = random.Random(options['seed'])
+        self.scale = options['scale']
+        self.batch_size = options['batch_size']
+
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError(
+                'No ingredients or tags found, run load_db first'
+            )
+        self.rng.shuffle(self.ingredient_ids)
+        self.ingredient_weights = zipf_weights(len(self.ingredient_ids))
+
+        user_ids = self._create_users(options['seed'])
+        recipe_ids = self._create_recipes(user_ids)
+        self._create_relations(Favourite, 'recipe', user_ids, recipe_ids,
+                               FAVOURITES)
+        self._create_relations(ShoppingCart, 'recipe', user_ids, recipe_ids,
+                               SHOPPING_CARTS)
+        self._create_relations(Subscription, 'author', user_ids, user_ids,
+                               SUBSCRIPTIONS)
+
+        rebuild_counters()
+        self.stdout.write(self.style.SUCCESS('Dataset generated'))
+
+    def _count(self, base: int) -> int:
+        return max(1, int(base * self.scale))
+
+    def _report(self, name: str, count: int, started: float):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'{name}: {count} rows, {count / elapsed:.0f} rows/s'
+        )
+
+    def _bulk_create(self, model: models.Model, objects: list, **kwargs):
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(
+                objects[start:start + self.batch_size],
+                **kwargs
+            )
+
+    def _create_users(self, seed: int) -> list:
+        started = time.monotonic()
+        password = make_password(PASSWORD)
+        prefix = f'synthetic_{seed}_'
+        count = self._count(USERS)
+
+        self._bulk_create(
+            User,
+            [
+                User(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name='Пользователь',
+                    last_name=str(number),
+                    password=password,
+                )
+                for number in range(count)
+            ],
+            ignore_conflicts=True
+        )
+        user_ids = list(
+            User.objects.filter(
+                username__startswith=prefix
+            ).order_by('id').values_list('id', flat=True)
+        )
+        self.rng.shuffle(user_ids)
+        self._report('User', count, started)
+
+        return user_ids
+
+    def _create_image(self) -> str:
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), '#c45f4f').save(buffer, 'PNG')
+
+        # Хранилище адресует файлы по содержимому, поэтому повторный
+        # запуск не создает новый файл.
+        return Recipe.image.field.storage.save(
+            IMAGE_NAME,
+            ContentFile(buffer.getvalue())
+        )
+
+    def _create_recipes(self, user_ids: list) -> list:
+        started = time.monotonic()
+        image = self._create_image()
+        author_weights = zipf_weights(len(user_ids))
+        ingredient_names = dict(
+            Ingredient.objects.values_list('id', 'name')
+        )
+        total = self._count(RECIPES)
+        recipe_ids = []
+
+        for start in range(0, total, self.batch_size):
+            size = min(self.batch_size, total - start)
+            authors = self.rng.choices(
+                user_ids,
+                cum_weights=author_weights,
+                k=size
+            )
+            compositions = [self._compose() for _ in range(size)]
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    name=ingredient_names[ingredients[0]][:200],
+                    text='Синтетический рецепт для нагрузочного теста.',
+                    cooking_time=self.rng.randint(1, 180),
+                    image=image,
+                    author_id=author,
+                )
+                for author, ingredients in zip(authors, compositions)
+            ])
+
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredient,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe, ingredients in zip(recipes, compositions)
+                for ingredient in ingredients
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag)
+                for recipe in recipes
+                for tag in self.rng.sample(
+                    self.tag_ids,
+                    min(self.rng.randint(*TAGS_PER_RECIPE),
+                        len(self.tag_ids))
+                )
+            ])
+            refresh_documents(recipe.id for recipe in recipes)
+            recipe_ids.extend(recipe.id for recipe in recipes)
+
+        self.rng.shuffle(recipe_ids)
+        self._report('Recipe', total, started)
+
+        return recipe_ids
+
+    def _compose(self) -> list:
+        count = min(
+            self.rng.randint(*INGREDIENTS_PER_RECIPE),
+            len(self.ingredient_ids)
+        )
+        ingredients = set()
+        while len(ingredients) < count:
+            ingredients.update(self.rng.choices(
+                self.ingredient_ids,
+                cum_weights=self.ingredient_weights,
+                k=count - len(ingredients)
+            ))
+
+        return list(ingredients)
+
+    def _create_relations(self,
+                          model: models.Model,
+                          target_field: str,
+                          user_ids: list,
+                          target_ids: list,
+                          base: int):
+        """
+        Создает связи пользователей с объектами, популярность которых
+        подчиняется степенному закону.
+        """
+        started = time.monotonic()
+        target_weights = zipf_weights(len(target_ids))
+        total = self._count(base)
+
+        for start in range(0, total, self.batch_size):
+            size = min(self.batch_size, total - start)
+            users = self.rng.choices(user_ids, k=size)
+            targets = self.rng.choices(
+                target_ids,
+                cum_weights=target_weights,
+                k=size
+            )
+            pairs = {
+                (user, target)
+                for user, target in zip(users, targets)
+                if user != target or target_field != 'author'
+            }
+            model.objects.bulk_create(
+                [
+                    model(user_id=user, **{f'{target_field}_id': target})
+                    for user, target in pairs
+                ],
+                ignore_conflicts=True
+            )
+
+        self._report(model.__name__, total, started)
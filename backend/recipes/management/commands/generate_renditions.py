@@ -0,0 +1,82 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.documents import invalidate_documents
+from recipes.images import create_renditions, is_up_to_date, stored_renditions
+from recipes.models import Recipe
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие уменьшенные копии изображений рецептов.'
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '-f',
+            '--force',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов'
+        )
+        parser.add_argument(
+            '-b',
+            '--batch_size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Размер пакета обновления'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        force = options['force']
+        batch_size = options['batch_size']
+
+        # Рецепты с одним и тем же файлом обрабатываются один раз.
+        renditions = {}
+        batch = []
+        updated = failed = 0
+
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions'
+        ).order_by('id')
+        for recipe in recipes.iterator(chunk_size=batch_size):
+            name = recipe.image.name
+            if not force and is_up_to_date(name, recipe.image_renditions):
+                continue
+
+            if name not in renditions:
+                try:
+                    renditions[name] = (
+                        None if force else stored_renditions(recipe.image)
+                    ) or create_renditions(recipe.image)
+                except OSError as error:
+                    renditions[name] = None
+                    self.stderr.write(f'{name}: {error}')
+
+            if renditions[name] is None:
+                failed += 1
+                continue
+
+            recipe.image_renditions = renditions[name]
+            batch.append(recipe)
+            if len(batch) >= batch_size:
+                updated += self._save(batch)
+                batch = []
+
+        if batch:
+            updated += self._save(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Renditions created for {updated} recipes, {failed} failed'
+            )
+        )
+
+    @staticmethod
+    def _save(batch: list) -> int:
+        with transaction.atomic():
+            # Документы рецептов содержат ссылки на копии.
+            invalidate_documents(pk__in=[recipe.pk for recipe in batch])
+            return Recipe.objects.bulk_update(batch, ['image_renditions'])
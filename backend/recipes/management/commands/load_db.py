@@ -1,9 +1,12 @@
 import csv
-from typing import Any
+import time
+from itertools import islice
+from typing import Any, Iterable, Iterator
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
-from django.db import models
+from django.db import connection, models, transaction
 from recipes.models import Ingredient, Tag
 
 User = get_user_model()
@@ -15,6 +18,14 @@ MODELS_SOURCE = [
 
 USER_SOURCE = ('recipes/data/users.csv', User)
 
+BATCH_SIZE = 1000
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
 
 class Command(BaseCommand):
     help = 'Наполняет БД тегами и ингредиентами.'
@@ -26,8 +37,24 @@ class Command(BaseCommand):
             action='store_true',
             help='Создание тестового пользователя'
         )
+        parser.add_argument(
+            '-b',
+            '--batch_size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество строк в одной вставке'
+        )
+        parser.add_argument(
+            '--no_copy',
+            action='store_true',
+            help='Не использовать COPY в PostgreSQL'
+        )
 
     def handle(self, *args: Any, **options: Any) -> str | None:
+        self.batch_size = options['batch_size']
+        self.use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
 
         for path, model in MODELS_SOURCE:
             self._populate_model(path, model)
@@ -42,15 +69,80 @@ class Command(BaseCommand):
                         source: str,
                         model: models.Model,
                         user_mode: bool | None = False):
-        with open(source, encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    if user_mode:
-                        model.objects.create_user(**row)
+        started = time.monotonic()
+        try:
+            with open(source, encoding='utf-8') as file:
+                with transaction.atomic():
+                    if self.use_copy and not user_mode:
+                        processed, inserted = self._copy(file, model)
                     else:
-                        model.objects.create(**row)
-                except Exception as e:
-                    raise CommandError(
-                        f'Error while populating model {model}: {e}'
-                    )
+                        processed, inserted = self._bulk_create(
+                            file,
+                            model,
+                            user_mode
+                        )
+        except Exception as e:
+            raise CommandError(
+                f'Error while populating model {model}: {e}'
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f'{model.__name__}: {processed} rows processed, '
+            f'{inserted} inserted, {processed / elapsed:.0f} rows/s'
+        )
+
+    def _bulk_create(self, file, model: models.Model, user_mode: bool):
+        reader = csv.DictReader(file)
+        processed = 0
+        existing = model.objects.count()
+
+        for batch in batched(reader, self.batch_size):
+            if user_mode:
+                for row in batch:
+                    row['password'] = make_password(row['password'])
+
+            model.objects.bulk_create(
+                [model(**row) for row in batch],
+                ignore_conflicts=True
+            )
+            processed += len(batch)
+            self.stdout.write(f'{model.__name__}: {processed} rows processed')
+
+        return processed, model.objects.count() - existing
+
+    def _copy(self, file, model: models.Model):
+        """
+        Загружает CSV через COPY во временную таблицу и переносит
+        строки в целевую, пропуская конфликтующие.
+        """
+        quote = connection.ops.quote_name
+        columns = next(csv.reader(file))
+        for column in columns:
+            model._meta.get_field(column)
+        file.seek(0)
+
+        table = quote(model._meta.db_table)
+        staging = quote(f'load_db_{model._meta.model_name}')
+        column_list = ', '.join(quote(column) for column in columns)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS '
+                f'SELECT {column_list} FROM {table} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY {staging} ({column_list}) '
+                f'FROM STDIN WITH (FORMAT csv, HEADER true)',
+                file
+            )
+            cursor.execute(f'SELECT COUNT(*) FROM {staging}')
+            processed = cursor.fetchone()[0]
+            cursor.execute(
+                f'INSERT INTO {table} ({column_list}) '
+                f'SELECT DISTINCT {column_list} FROM {staging} '
+                f'ON CONFLICT DO NOTHING'
+            )
+            inserted = cursor.rowcount
+
+        return processed, inserted
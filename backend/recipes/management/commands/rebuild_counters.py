@@ -0,0 +1,36 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.counters import rebuild_counters, verify_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики рецептов и авторов.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счетчики, не исправляя их'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        if options['check']:
+            mismatches = verify_counters()
+            for counter, count in mismatches.items():
+                self.stdout.write(f'{counter}: {count} mismatched rows')
+
+            if any(mismatches.values()):
+                raise CommandError('Counters are out of sync')
+
+            self.stdout.write(self.style.SUCCESS('Counters are consistent'))
+            return
+
+        with transaction.atomic():
+            fixed = rebuild_counters()
+
+        for counter, count in fixed.items():
+            self.stdout.write(f'{counter}: {count} rows fixed')
+
+        self.stdout.write(self.style.SUCCESS('Counters rebuilt'))
@@ -0,0 +1,45 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.documents import refresh_documents
+from recipes.models import Recipe
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает готовые представления рецептов.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '-b',
+            '--batch_size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Размер пакета обновления'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> str | None:
+        batch_size = options['batch_size']
+        ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+
+        rebuilt = 0
+        batch = []
+        for recipe_id in ids.iterator(chunk_size=batch_size):
+            batch.append(recipe_id)
+            if len(batch) >= batch_size:
+                rebuilt += self._rebuild(batch)
+                batch = []
+
+        if batch:
+            rebuilt += self._rebuild(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Documents rebuilt for {rebuilt} recipes')
+        )
+
+    @staticmethod
+    def _rebuild(batch: list) -> int:
+        with transaction.atomic():
+            return len(refresh_documents(batch))
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:08
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'recipes', 'Favourite', 'recipe'),
+    ('recipes', 'Recipe', 'shopping_cart_count', 'recipes', 'ShoppingCart', 'recipe'),
+    ('users', 'User', 'recipes_count', 'recipes', 'Recipe', 'author'),
+    ('users', 'User', 'followers_count', 'users', 'Subscription', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for app, model_name, field, related_app, related_name, related_field in COUNTERS:
+        model = apps.get_model(app, model_name)
+        related_model = apps.get_model(related_app, related_name)
+        counts = related_model.objects.order_by().filter(
+            **{related_field: OuterRef('pk')}
+        ).values(related_field).annotate(total=Count('pk')).values('total')
+        model.objects.update(**{
+            field: Coalesce(
+                Subquery(counts, output_field=IntegerField()),
+                Value(0)
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_alter_recipeingredient_ingredient_and_more'),
+        ('users', '0003_user_followers_count_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:20
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes import fulltext
+
+
+def install_search(apps, schema_editor):
+    fulltext.install(schema_editor, apps.get_model('recipes', 'Recipe'))
+
+
+def uninstall_search(apps, schema_editor):
+    fulltext.uninstall(schema_editor, apps.get_model('recipes', 'Recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
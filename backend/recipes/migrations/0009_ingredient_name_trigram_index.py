@@ -0,0 +1,43 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:21
+
+from django.db import migrations
+
+from recipes.fulltext import split_table_name
+
+INDEX_NAME = 'ingredient_name_trgm_idx'
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    ingredient = apps.get_model('recipes', 'Ingredient')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        f'ON {schema_editor.quote_name(ingredient._meta.db_table)} '
+        'USING gin (name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    ingredient = apps.get_model('recipes', 'Ingredient')
+    schema, _ = split_table_name(ingredient._meta.db_table)
+    name = INDEX_NAME if schema is None else (
+        f'{schema_editor.quote_name(schema)}.{INDEX_NAME}'
+    )
+    schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
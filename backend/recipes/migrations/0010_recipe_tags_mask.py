@@ -0,0 +1,47 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:23
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from recipes import fulltext
+
+MAX_TAG_BITS = 63
+
+
+def fill_tags_mask(apps, schema_editor):
+    recipe = apps.get_model('recipes', 'Recipe')
+    masks = defaultdict(int)
+    for recipe_id, tag_id in recipe.tags.through.objects.values_list(
+        'recipe_id', 'tag_id'
+    ).iterator():
+        if 0 < tag_id <= MAX_TAG_BITS:
+            masks[recipe_id] |= 1 << (tag_id - 1)
+
+    recipe.objects.bulk_update(
+        [recipe(pk=pk, tags_mask=mask) for pk, mask in masks.items()],
+        ['tags_mask'],
+        batch_size=1000
+    )
+
+
+def restore_search(apps, schema_editor):
+    fulltext.restore(schema_editor, apps.get_model('recipes', 'Recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+        migrations.RunPython(restore_search, migrations.RunPython.noop),
+    ]
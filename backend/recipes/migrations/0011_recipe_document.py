@@ -0,0 +1,26 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_tags_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('document', models.JSONField(verbose_name='Представление')),
+            ],
+            options={
+                'verbose_name': 'Представление рецепта',
+                'verbose_name_plural': 'Представления рецептов',
+                'db_table': 'content"."recipe_document',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+from recipes import fulltext
+
+
+def restore_search(apps, schema_editor):
+    fulltext.restore(schema_editor, apps.get_model('recipes', 'Recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search),
+        migrations.AddField(
+            model_name='recipe',
+            name='document_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия представления'),
+        ),
+        migrations.AddField(
+            model_name='recipedocument',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия'),
+        ),
+        migrations.RunPython(restore_search, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 from django.db.models import UniqueConstraint
+from users.models import DenormalizedFieldsMixin
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -63,7 +67,13 @@ class Tag(models.Model):
         verbose_name_plural = 'Теги'
 
 
-class Recipe(models.Model):
+class RecipeManager(models.Manager):
+    def get_queryset(self):
+        # Поисковый вектор нужен только в условиях запроса.
+        return super().get_queryset().defer('search_vector')
+
+
+class Recipe(DenormalizedFieldsMixin, models.Model):
     """Модель представления рецепта."""
 
     name = models.CharField(
@@ -80,7 +90,14 @@ class Recipe(models.Model):
     text = models.TextField('Описание')
     image = models.ImageField(
         'Изображение',
-        upload_to='recipes/'
+        upload_to='recipes/',
+        storage=ContentAddressedStorage()
+    )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
     )
     cooking_time = models.PositiveSmallIntegerField(
         'Время приготовления',
@@ -99,6 +116,42 @@ class Recipe(models.Model):
         related_name='recipes',
         help_text='Выберите теги',
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False
+    )
+    # Бит tag_id - 1 для каждого тега рецепта, см. recipes.counters.
+    tags_mask = models.BigIntegerField(
+        'Маска тегов',
+        default=0,
+        editable=False
+    )
+    # Увеличивается при каждом изменении, см. recipes.documents.
+    document_version = models.PositiveIntegerField(
+        'Версия представления',
+        default=0,
+        editable=False
+    )
+    # Заполняется триггером, см. recipes.fulltext.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeManager()
+
+    denormalized_fields = (
+        'favorites_count',
+        'shopping_cart_count',
+        'tags_mask',
+        'document_version',
+    )
 
     class Meta:
         db_table = 'content\".\"recipe'
@@ -201,3 +254,28 @@ class ShoppingCart(models.Model):
                 fields=['user', 'recipe'],
                 name='unique_shopping_cart')
         ]
+
+
+class RecipeDocument(models.Model):
+    """
+    Готовое представление рецепта, не зависящее от пользователя.
+
+    Заполняется функциями recipes.documents и пересоздается
+    командой rebuild_documents. Документ актуален, пока его версия
+    совпадает с Recipe.document_version.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='document',
+        verbose_name='Рецепт'
+    )
+    document = models.JSONField('Представление')
+    version = models.PositiveIntegerField('Версия', default=0)
+
+    class Meta:
+        db_table = 'content\".\"recipe_document'
+        verbose_name = 'Представление рецепта'
+        verbose_name_plural = 'Представления рецептов'
@@ -0,0 +1,223 @@
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, Q
+
+from .models import Ingredient
+
+FUZZY_LIMIT = 20
+MAX_FUZZY_LIMIT = 100
+
+# Доля триграмм запроса, которые должны встретиться в названии.
+# В PostgreSQL то же значение задается параметром
+# pg_trgm.word_similarity_threshold в настройках подключения.
+WORD_SIMILARITY_THRESHOLD = 0.5
+
+WORD = re.compile(r'\w+')
+
+# Интервал сверки процессного индекса с базой и срок его жизни, секунды.
+INDEX_CHECK_INTERVAL = 5
+INDEX_TTL = 300
+
+
+@dataclass
+class IndexSnapshot:
+    data: tuple
+    version: tuple
+    check_at: float
+    expires_at: float
+
+
+def trigrams(value: str) -> set[str]:
+    """Триграммы строки по правилам pg_trgm."""
+    result = set()
+    for word in WORD.findall(value.casefold()):
+        padded = f'  {word} '
+        result.update(
+            padded[index:index + 3] for index in range(len(padded) - 2)
+        )
+
+    return result
+
+
+class IngredientIndex:
+    """
+    Процессный индекс ингредиентов для поиска по началу названия.
+
+    Названия хранятся в отсортированном списке в casefold-виде, поиск
+    выполняется бинарным поиском. Для нечеткого поиска строится
+    инвертированный индекс триграмм. Индекс строится при первом
+    обращении и сбрасывается сигналами при изменении ингредиентов.
+
+    Изменения из других процессов и массовые операции сигналов не
+    отправляют, поэтому не чаще раза в check_interval секунд индекс
+    сверяет с базой число и максимальный id ингредиентов, а через
+    ttl секунд перестраивается в любом случае.
+    """
+
+    def __init__(self, check_interval: float = INDEX_CHECK_INTERVAL,
+                 ttl: float = INDEX_TTL):
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshot = None
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    @staticmethod
+    def _get_version() -> tuple:
+        version = Ingredient.objects.aggregate(
+            count=Count('id'),
+            last_id=Max('id')
+        )
+        return version['count'], version['last_id']
+
+    def _build(self):
+        rows = list(
+            Ingredient.objects.values('id', 'name', 'measurement_unit')
+        )
+        entries = sorted(
+            (row['name'].casefold(), position)
+            for position, row in enumerate(rows)
+        )
+        keys = [key for key, _ in entries]
+        positions = [position for _, position in entries]
+
+        postings = defaultdict(list)
+        sizes = []
+        for position, row in enumerate(rows):
+            row_trigrams = trigrams(row['name'])
+            sizes.append(len(row_trigrams))
+            for trigram in row_trigrams:
+                postings[trigram].append(position)
+
+        return rows, keys, positions, dict(postings), sizes
+
+    def _get_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < snapshot.check_at:
+            return snapshot.data
+
+        with self._build_lock:
+            with self._lock:
+                snapshot = self._snapshot
+                generation = self._generation
+            now = time.monotonic()
+
+            if snapshot is not None and now < snapshot.expires_at:
+                if now < snapshot.check_at:
+                    return snapshot.data
+                if self._get_version() == snapshot.version:
+                    snapshot.check_at = now + self.check_interval
+                    return snapshot.data
+
+            data = self._build()
+            rows = data[0]
+            snapshot = IndexSnapshot(
+                data,
+                (len(rows), max((row['id'] for row in rows), default=None)),
+                check_at=now + self.check_interval,
+                expires_at=now + self.ttl
+            )
+
+            # Сброс во время построения означает, что данные могли
+            # устареть: снимок возвращается, но не сохраняется.
+            with self._lock:
+                if self._generation == generation:
+                    self._snapshot = snapshot
+
+            return snapshot.data
+
+    def search(self, prefix: str) -> list[dict]:
+        """
+        Возвращает ингредиенты, название которых начинается с prefix,
+        в порядке сортировки модели.
+        """
+        rows, keys, positions, _, _ = self._get_snapshot()
+        prefix = prefix.casefold()
+
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+
+        return [rows[position] for position in sorted(positions[start:end])]
+
+    def fuzzy_search(self, query: str, limit: int = FUZZY_LIMIT) -> list[dict]:
+        """
+        Возвращает до limit ингредиентов, похожих на query.
+
+        Кандидаты выбираются по спискам вхождений триграмм запроса,
+        поэтому просматриваются только названия с общими триграммами.
+        Сначала идут названия, начинающиеся с query, затем остальные
+        в порядке убывания сходства.
+        """
+        rows, _, _, postings, sizes = self._get_snapshot()
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return []
+
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+
+        prefix = query.casefold()
+        minimum = WORD_SIMILARITY_THRESHOLD * len(query_trigrams)
+        candidates = (
+            (
+                rows[position]['name'].casefold().startswith(prefix),
+                count / len(query_trigrams),
+                count / (len(query_trigrams) + sizes[position] - count),
+                position
+            )
+            for position, count in shared.items()
+            if count >= minimum
+        )
+        best = heapq.nlargest(
+            limit,
+            candidates,
+            key=lambda item: (item[0], item[1], item[2], -item[3])
+        )
+
+        return [rows[item[3]] for item in best]
+
+
+def fuzzy_search_ingredients(query: str,
+                             limit: int = FUZZY_LIMIT) -> list[dict]:
+    """
+    Нечеткий поиск ингредиентов по триграммам.
+
+    В PostgreSQL используется индекс pg_trgm, в остальных базах —
+    процессный индекс ingredient_index.
+    """
+    if connection.vendor != 'postgresql':
+        return ingredient_index.fuzzy_search(query, limit)
+
+    return list(
+        Ingredient.objects.filter(
+            name__trigram_word_similar=query
+        ).annotate(
+            is_prefix=ExpressionWrapper(
+                Q(name__istartswith=query),
+                output_field=BooleanField()
+            ),
+            similarity=TrigramWordSimilarity(query, 'name')
+        ).order_by(
+            '-is_prefix', '-similarity', 'name'
+        ).values('id', 'name', 'measurement_unit')[:limit]
+    )
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,154 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .counters import has_any_tag, increment, update_tags_mask
+from .documents import invalidate_documents
+from .images import update_renditions
+from .models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .search import ingredient_index
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+def increment_counters(sender, instance, created, **kwargs):
+    if created:
+        _update_counters(sender, instance, 1)
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_renditions(sender, instance, raw, **kwargs):
+    if raw:
+        return
+
+    try:
+        update_renditions(instance)
+    except OSError:
+        logger.exception(
+            'Не удалось создать копии изображения рецепта %s', instance.pk
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_recipe_tags_mask(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    if action == 'pre_clear':
+        # После очистки связи уже не прочитать, запоминаем их заранее.
+        instance._cleared_pks = list(
+            instance.recipes.values_list('pk', flat=True) if reverse
+            else instance.tags.values_list('pk', flat=True)
+        )
+        return
+
+    if action == 'post_clear':
+        pk_set = set(instance.__dict__.pop('_cleared_pks', ()))
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    if not pk_set:
+        return
+
+    add = action == 'post_add'
+    if reverse:
+        update_tags_mask(pk_set, (instance.pk,), add)
+    else:
+        update_tags_mask((instance.pk,), pk_set, add)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_deleted_tag(sender, instance, **kwargs):
+    # Тег, не помещающийся в маску, в масках рецептов не отмечен.
+    condition = has_any_tag((instance.pk,))
+    if condition is None:
+        return
+
+    # Связи удаляются каскадно, без сигнала m2m_changed.
+    update_tags_mask(
+        Recipe.objects.filter(condition).values('pk'),
+        (instance.pk,),
+        add=False
+    )
+
+
+# Документы рецептов отмечаются устаревшими и пересобираются при
+# следующем чтении. Массовые операции сигналов не отправляют,
+# после них invalidate_documents вызывается явно.
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_document(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        invalidate_documents(pk=instance.pk)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_ingredient_document(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        invalidate_documents(pk=instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_documents(sender, instance, action, reverse,
+                                     pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'pre_clear'):
+            invalidate_documents(pk=instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        invalidate_documents(pk__in=pk_set)
+    elif action == 'pre_clear':
+        invalidate_documents(tags=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag_documents(sender, instance, **kwargs):
+    if not kwargs.get('created'):
+        invalidate_documents(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_ingredient_documents(sender, instance, **kwargs):
+    if not kwargs.get('created'):
+        invalidate_documents(recipe_ingredient__ingredient=instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_documents(sender, instance, created, update_fields,
+                                **kwargs):
+    # Вход пользователя обновляет только last_login.
+    if created or (
+        update_fields is not None and set(update_fields) <= {'last_login'}
+    ):
+        return
+
+    invalidate_documents(author=instance)
+
+
+@receiver(post_delete, sender=Favourite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+def decrement_counters(sender, instance, **kwargs):
+    _update_counters(sender, instance, -1)
+
+
+def _update_counters(sender, instance, delta: int):
+    if sender is Favourite:
+        increment(Recipe, instance.recipe_id, 'favorites_count', delta)
+    elif sender is ShoppingCart:
+        increment(Recipe, instance.recipe_id, 'shopping_cart_count', delta)
+    elif sender is Recipe and instance.author_id is not None:
+        increment(User, instance.author_id, 'recipes_count', delta)
@@ -0,0 +1,75 @@
+import hashlib
+import re
+from pathlib import PurePosixPath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Имя файла, уже полученное из хэша содержимого: сам хэш
+# или производная от него копия вида <хэш>.<копия>.webp.
+ADDRESSED_NAME = re.compile(r'^([0-9a-f]{64})(\.|$)')
+
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, именующее файлы по SHA-256 их содержимого.
+
+    Файлы раскладываются по вложенным каталогам по первым символам
+    хэша. Повторная загрузка того же содержимого не записывает файл,
+    а возвращает имя уже существующего.
+    """
+
+    @staticmethod
+    def content_hash(content) -> str:
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        return digest.hexdigest()
+
+    @staticmethod
+    def shards(digest: str) -> tuple:
+        return tuple(
+            digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+            for level in range(SHARD_LEVELS)
+        )
+
+    @classmethod
+    def is_addressed(cls, name: str) -> bool:
+        path = PurePosixPath(name)
+        match = ADDRESSED_NAME.match(path.name)
+
+        return bool(match) and (
+            path.parts[-SHARD_LEVELS - 1:-1] == cls.shards(match.group(1))
+        )
+
+    @classmethod
+    def addressed_name(cls, name: str, digest: str) -> str:
+        path = PurePosixPath(name)
+
+        return str(path.parent.joinpath(
+            *cls.shards(digest), digest + path.suffix.lower()
+        ))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        if not self.is_addressed(name):
+            name = self.addressed_name(name, self.content_hash(content))
+
+        if self.exists(name):
+            return name
+
+        return super().save(name, content, max_length)
@@ -0,0 +1,160 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from . import fulltext
+from .counters import MAX_TAG_BITS, tag_bit
+from .models import Ingredient, Recipe, Tag
+from .search import IngredientIndex
+
+
+class SearchMigrationTest(TransactionTestCase):
+    """Поиск рецептов после применения и отката миграций."""
+
+    before_search_restore = ('recipes', '0009_ingredient_name_trigram_index')
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+
+        return executor.loader.project_state(targets).apps
+
+    def assert_search_follows_changes(self, apps):
+        recipe_model = apps.get_model('recipes', 'Recipe')
+        recipe = recipe_model.objects.create(
+            name='Борщ', text='Свекла и капуста', cooking_time=60
+        )
+
+        def found(value):
+            return list(
+                fulltext.search(recipe_model.objects.all(), value).values_list(
+                    'pk', flat=True
+                )
+            )
+
+        self.assertEqual(found('борщ'), [recipe.pk])
+
+        recipe.name = 'Окрошка'
+        recipe.save()
+        self.assertEqual(found('борщ'), [])
+        self.assertEqual(found('окрошка'), [recipe.pk])
+
+        recipe.delete()
+        self.assertEqual(found('окрошка'), [])
+
+    def test_search_after_migrations(self):
+        leaf_nodes = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        self.migrate([self.before_search_restore])
+        try:
+            self.assert_search_follows_changes(self.migrate(leaf_nodes))
+        finally:
+            self.migrate(leaf_nodes)
+
+    def test_search_after_rollback(self):
+        leaf_nodes = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        try:
+            self.assert_search_follows_changes(
+                self.migrate([self.before_search_restore])
+            )
+        finally:
+            self.migrate(leaf_nodes)
+
+
+class TagsMaskTest(TestCase):
+    """Маска тегов рецепта следует за изменением и удалением тегов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.wide_tag = Tag.objects.create(
+            pk=MAX_TAG_BITS + 1, name='Обед', color='#49B64E', slug='lunch'
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Омлет', text='Яйца', cooking_time=10
+        )
+        cls.recipe.tags.set((cls.tag, cls.wide_tag))
+
+    def get_mask(self) -> int:
+        return Recipe.objects.get(pk=self.recipe.pk).tags_mask
+
+    def test_mask_follows_tags(self):
+        self.assertEqual(self.get_mask(), tag_bit(self.tag.pk))
+
+        self.recipe.tags.remove(self.tag)
+        self.assertEqual(self.get_mask(), 0)
+
+        self.tag.recipes.add(self.recipe)
+        self.assertEqual(self.get_mask(), tag_bit(self.tag.pk))
+
+    def test_delete_tag(self):
+        self.tag.delete()
+
+        self.assertEqual(self.get_mask(), 0)
+
+    def test_delete_tag_outside_mask(self):
+        self.wide_tag.delete()
+
+        self.assertEqual(self.get_mask(), tag_bit(self.tag.pk))
+        self.assertQuerysetEqual(
+            Recipe.objects.get(pk=self.recipe.pk).tags.all(), [self.tag]
+        )
+
+
+class IngredientIndexTest(TestCase):
+    """Поиск ингредиентов по процессному индексу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Сгущённое молоко', 'Мука', 'молоко', 'Молоко овсяное'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def get_names(self, ingredients) -> list:
+        return [ingredient['name'] for ingredient in ingredients]
+
+    def test_prefix_search(self):
+        index = IngredientIndex()
+
+        # Порядок совпадает с сортировкой модели, зависящей от СУБД.
+        self.assertEqual(
+            self.get_names(index.search('МОЛ')),
+            [
+                name
+                for name in Ingredient.objects.values_list('name', flat=True)
+                if name.casefold().startswith('мол')
+            ]
+        )
+        self.assertEqual(len(index.search('мол')), 2)
+        self.assertEqual(self.get_names(index.search('сыр')), [])
+
+    def test_index_follows_changes(self):
+        index = IngredientIndex(check_interval=0)
+        self.assertEqual(self.get_names(index.search('мук')), ['Мука'])
+
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Мускатный орех', measurement_unit='г')]
+        )
+        self.assertEqual(
+            self.get_names(index.search('му')), ['Мука', 'Мускатный орех']
+        )
+
+        Ingredient.objects.filter(name='Мука').update(name='Мука ржаная')
+        index.invalidate()
+        self.assertEqual(
+            self.get_names(index.search('мука')), ['Мука ржаная']
+        )
+
+    def test_fuzzy_search(self):
+        index = IngredientIndex()
+
+        found = self.get_names(index.fuzzy_search('молоко'))
+        self.assertEqual(
+            sorted(found[:2]), sorted(['молоко', 'Молоко овсяное'])
+        )
+        self.assertEqual(found[2:], ['Сгущённое молоко'])
+
+        self.assertIn('молоко', self.get_names(index.fuzzy_search('малоко')))
+        self.assertEqual(len(index.fuzzy_search('молоко', limit=1)), 1)
+        self.assertEqual(index.fuzzy_search('...'), [])
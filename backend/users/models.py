@@ -2,7 +2,42 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class DenormalizedFieldsMixin:
+    """
+    Не записывает при сохранении поля, изменяемые только запросами.
+
+    Счетчики обновляются выражениями F() в обработчиках сигналов, и
+    значения в памяти объекта могут быть устаревшими. Полное
+    сохранение существующего объекта записывает все загруженные поля,
+    кроме denormalized_fields; новый объект сохраняется целиком.
+    """
+
+    denormalized_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if (
+            update_fields is None
+            and not force_insert
+            and not self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.denormalized_fields
+            ]
+
+        super().save(
+            force_insert=force_insert,
+            force_update=force_update,
+            using=using,
+            update_fields=update_fields
+        )
+
+
+class User(DenormalizedFieldsMixin, AbstractUser):
     ADMIN = 'admin'
     MODERATOR = 'moderator'
     USER = 'user'
@@ -19,6 +54,18 @@ class User(AbstractUser):
         max_length=10,
         verbose_name='Роль',
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False
+    )
+
+    denormalized_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'Пользователь'